@@ -3,6 +3,10 @@ This script is made to make it easier to assign
 people that sign up to the introweek after the deadline/via mail
 and not with the form.
 It assign group numbers for a specified amount of students
+
+If the group state file of createGroups.py is available, every student is
+placed into the group where they share the fewest traits with the others
+(otherwise the group numbers are random)
 """
 
 import os
@@ -21,12 +25,32 @@ except ImportError as exc:
     print("Most likely this is done with 'pip install pandas openpyxl numpy'")
     raise exc
 
+from groupStateFile import load_state, place_student, save_state
+from outputWriter import write_table
+from rosterCache import read_roster
+
 ###########################################
 # ADJUST THESE PARAMETERS
 # INPUT FILE PATH (absolute or relative path!)
 FILE = "testing/testdata.xlsx"
 
-# Highest buddy group number
+# Keep a parsed copy of the input file (in '.roster_cache' next to it)
+# so that reruns on the same file do not need to parse the excel file again
+USE_CACHE = True
+
+# Format of the output files
+# "xlsx": excel (old behavior), "xlsx-stream": excel written row by row (faster, less memory)
+# "csv": csv files (fastest), "parquet": parquet files (needs the package pyarrow)
+OUTPUT_FORMAT = "xlsx"
+
+# Group state file written by createGroups.py (in its output directory)
+# every student is placed into the most fitting group and the file is updated,
+# so the next run also knows about these students (students that are already
+# in the file keep their group, so a rerun on the same file changes nothing)
+# (None or a missing file = random group numbers between 1 and MAX_NUM, old behavior)
+STATE_FILE = "groups/group_state.json"
+
+# Highest buddy group number (only used without a STATE_FILE)
 MAX_NUM = 30
 
 # PREFIX (Masters = "M", Exchange = "E")
@@ -68,7 +92,30 @@ def get_rand_group(rng, max_val, prefix):
     return return_val
 
 
-def main(filepath, max_n, config, prefix):
+def assign_from_state(df, state, sn_col):
+    """
+    Helper function to place the students one after the other into the
+    group where they share the fewest traits (the state is updated)
+    Students that are already in the state keep their group
+    Returns the buddy group of every student
+    """
+    # the attribute columns as in createGroups.py (missing values as "N/A")
+    columns = [a["column"] for a in state["attributes"]]
+    values = df[columns].fillna("N/A").itertuples(index=False, name=None)
+    return [
+        state["labels"][place_student(state, s, row)] for s, row in zip(df[sn_col], values)
+    ]
+
+
+def main(
+    filepath,
+    max_n,
+    config,
+    prefix,
+    use_cache=USE_CACHE,
+    output_format=OUTPUT_FORMAT,
+    state_file=STATE_FILE,
+):
     """
     The main function of this script
     """
@@ -76,26 +123,38 @@ def main(filepath, max_n, config, prefix):
     if not os.path.isfile(filepath):
         print(f"FATAL ERROR: Could not find input file. Provided path is: '{filepath}'")
         sys.exit(1)
+    if state_file is not None and not os.path.isfile(state_file):
+        print(f"WARNING: Could not find group state file. Provided path is: '{state_file}'")
+        print(f"Assigning random group numbers between 1 and {max_n} instead")
+        print("(run createGroups.py first to place the students into the most fitting groups)")
+        state_file = None
 
     # read the file
-    df = pd.read_excel(filepath, header=0)
+    df = read_roster(filepath, use_cache)
 
     # check for duplicates and quit if any are found
     check_duplicates(df, "All student info (exact duplicates)", True)
     check_duplicates(df[config["sn_col"]], "Student number", True)
     # check_duplicates(df[config["email_col"]], "Email", True)
 
-    # assign a random group number
-    # init the random number generator
-    # there is no need to init it for each iteration, once is enough
-    rng = np.random.default_rng()
-    df["Buddy Group"] = ""
-    df["Buddy Group"] = df["Buddy Group"].apply(
-        lambda row: get_rand_group(rng, max_n, prefix)
-    )
-
-    df.to_excel(f"restStudents_{prefix}.xlsx")
-    print(f"Results can be seen in 'restStudents_{prefix}.xlsx'")
+    if state_file is not None:
+        # place every student into the most fitting group
+        # and save the new composition of the groups
+        state = load_state(state_file)
+        df["Buddy Group"] = assign_from_state(df, state, config["sn_col"])
+        save_state(state_file, state)
+    else:
+        # assign a random group number
+        # init the random number generator
+        # there is no need to init it for each iteration, once is enough
+        rng = np.random.default_rng()
+        df["Buddy Group"] = ""
+        df["Buddy Group"] = df["Buddy Group"].apply(
+            lambda row: get_rand_group(rng, max_n, prefix)
+        )
+
+    out_path = write_table(df, f"restStudents_{prefix}.xlsx", output_format)
+    print(f"Results can be seen in '{out_path}'")
 
 
 if __name__ == "__main__":
@@ -23,11 +23,19 @@ feasible time frame (i.e. we cannot wait 100 years 10 days and 12 to the power o
 even though this would most likely come pretty close to finding the ideal distribution that has the max diversity)
 """
 
+import contextlib
+import csv
+import functools
+import itertools
+import json
+import multiprocessing
 import os
+import queue
 import sys
 import time
 
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
 
 # do a safe import
 # the reason for doing this is that for example openpyxl will otherwise
@@ -42,6 +50,10 @@ except ImportError as exc:
     print("Most likely this is done with 'pip install pandas openpyxl numpy'")
     raise exc
 
+from groupStateFile import build_state, load_state, save_state
+from outputWriter import write_table
+from rosterCache import cached_codes, read_roster
+
 ###########################################
 # ADJUST THESE PARAMETERS
 # INPUT FILE PATH (absolute or relative path!)
@@ -58,6 +70,15 @@ OUTPUT_P = "groups/"
 # Example: OUT_PREFIX = "M" will result in group files called M01.xlsx, M02.xlsx...
 OUT_PREFIX = "M"
 
+# Keep a parsed copy of the input file (in '.roster_cache' next to it)
+# so that reruns on the same file do not need to parse the excel file again
+USE_CACHE = True
+
+# Format of the output files
+# "xlsx": excel (old behavior), "xlsx-stream": excel written row by row (faster, less memory)
+# "csv": csv files (fastest), "parquet": parquet files (needs the package pyarrow)
+OUTPUT_FORMAT = "xlsx"
+
 # Setting on how to handle duplicates
 # the best is to run this w true for the first time and then fix everything
 # and only set this to false if you know that the flagged duplicates are no duplicates
@@ -78,44 +99,240 @@ CONFIG = {
     "country": "Home Country",
 }
 
+# The keys of CONFIG whose columns are used for the diversity score, with their weight
+# (two students sharing a category of the attribute reduce the score by the weight)
+# more attributes can be added by adding their column to CONFIG and their key here
+# e.g. "campus": "Campus" in CONFIG and "campus": 0.5 here
+ATTRIBUTES = {"gender": 1, "studyline": 1, "country": 1}
+
 # How long the script should try to create random groups (in minutes)
+# None = no time limit (then at least one of the other stop conditions below must be set)
 RUNTIME = 0.1  # Minutes
+
+# Further conditions on which the search stops early (None = not used)
+# any combination can be used, the search stops as soon as one of them is met
+# stop once this diversity score is reached
+TARGET_SCORE = None
+# an evaluation is: one tried group split ("pool" and "batch"), one tried swap of
+# two students ("anneal") or one pair of groups checked for a swap ("island")
+# stop once this many evaluations were done (in total over all workers)
+MAX_EVALS = None
+# stop if the best score has not improved in this many evaluations (per worker)
+PATIENCE_EVALS = None
+# stop if the best score has not improved in this many seconds
+PATIENCE_TIME = None
+
+# How the random search is run
+# "pool": one process pool for the whole run, every worker gets the students once
+# and searches on its own until the time is up (recommended)
+# "batch": a new process pool for every batch of 50 random group splits (old behavior)
+# "anneal": like "pool", but every worker runs a simulated annealing search
+# (random swaps of students that are also accepted if they worsen the score a bit)
+# instead of only creating random group splits
+# "island": like "pool", but every worker improves its own few group splits with
+# swaps of students and regularly sends its best split to the next worker
+SEARCH_MODE = "pool"
+
+# How the group splits of the search are created
+# "stratified": students with the rarest traits are placed first, every student
+# goes into the group where it shares the fewest traits (randomness only breaks ties)
+# "random": the students are shuffled and dealt out one by one (old behavior)
+INIT_MODE = "stratified"
+
+# Temperature at the start and at the end of the annealing search (SEARCH_MODE = "anneal")
+# the higher the temperature the more often swaps that worsen the score are accepted,
+# the temperature is lowered step by step until the time is up
+ANNEAL_T_START = 2.0
+ANNEAL_T_END = 0.05
+
+# Settings of the island search (SEARCH_MODE = "island")
+# every worker improves ISLAND_POPULATION group splits with greedy swaps, a split that
+# does not improve anymore is changed with ISLAND_KICK random swaps of students,
+# and every MIGRATION_INTERVAL seconds the best split of a worker is sent to the next
+# worker (a worker that did not improve since then restarts from the received split)
+ISLAND_POPULATION = 4
+ISLAND_KICK = 10
+MIGRATION_INTERVAL = 2.0  # Seconds
+
+# How many worker processes are used for the search (None = all available cores)
+N_WORKERS = None
+
+# How many random group splits a worker creates and scores at once with numpy
+# (SEARCH_MODE = "pool" with INIT_MODE = "random"; it is lowered for very large
+# cohorts to limit the memory use, 1 = one group split at a time)
+SAMPLE_BATCH = 256
+
+# Master seed for the random number generators (None = new random seed every run)
+# every worker gets its own independent random stream derived from this seed
+# the seed of a run is printed at the start, so a run can be repeated by setting it here
+SEED = None
+
+# How often the greedy swapping search is restarted on the best group split
+# if the search stopped before RUNTIME was over, the greedy search keeps
+# restarting with the time that is left (until it stops improving)
+GREEDY_RUNS = 100
+
+# Stop the greedy swapping search if this many restarts in a row did not
+# improve the score (None = always do all restarts)
+GREEDY_PATIENCE = 10
+
+# The greedy restarts are independent jobs that run on the worker processes
+# every restart starts from a copy of one of the best group splits of the search
+# (the best split of each of the best GREEDY_TOP_K search workers, in turns)
+# and shuffles the group order on its own (1 = every restart starts from the best split)
+GREEDY_TOP_K = 1
+
+# Give the rest of RUNTIME to the greedy search once the search falls behind it:
+# the improvement of the best score per second during the last ADAPT_WINDOW share of
+# RUNTIME is compared with the improvement per second of the greedy swapping (measured
+# once before the search), and the search stops once it is more than 1 / ADAPT_RATIO
+# times slower (False = the search always uses the whole RUNTIME, unless another stop
+# condition is met). Only used with a RUNTIME and not for SEARCH_MODE = "anneal",
+# whose cooling is planned for the whole RUNTIME
+ADAPT_BUDGET = True
+ADAPT_WINDOW = 0.2
+ADAPT_RATIO = 0.05
+
+# The search and the greedy phase stop early once the best diversity score is
+# at most this far away from the best score that is possible in theory (0 = stop only
+# when the theoretical best is reached, which is then guaranteed to be the best split)
+BOUND_TOLERANCE = 0
+
+# File to which the statistics of the run (time per phase, evaluations per second
+# of every worker, accepted swaps, best score over time) are written at the end
+# ".json" or ".csv" (None = only print a short summary)
+TELEMETRY_FILE = None
+
+# Name of the file (in the output directory) in which the composition of the groups
+# (size and category counts of every group) is saved, so that assignRest.py can
+# place students that sign up late into the most fitting group (None = not saved)
+STATE_FILE = "group_state.json"
+
+# Name of the file (in the output directory) in which the best group split found so far
+# (student numbers and their group, the score and some information about the run)
+# is saved every CHECKPOINT_INTERVAL seconds, so a cancelled run is not lost
+# the checkpoint of an earlier run is only overwritten by a better split of the same
+# students, one of other students is kept as CHECKPOINT_FILE + ".bak" (None = no checkpoints)
+CHECKPOINT_FILE = "checkpoint.json"
+CHECKPOINT_INTERVAL = 60  # Seconds
+
+# Continue from the group split in CHECKPOINT_FILE of an earlier run
+# (e.g. to give the search more time in several runs, or after changing some parameters)
+# the search and the greedy phase start from it, it is only used if it
+# holds exactly the students of FILE and the same N_GROUPS
+RESUME = False
+
+# Repair the group split in CHECKPOINT_FILE after students left or signed up late,
+# instead of searching a new split: students that are not in FILE anymore are removed,
+# new students are placed into the group where they share the fewest traits (students
+# are moved out of groups that became too large, so the group sizes stay balanced),
+# and then only swaps that involve these changed groups are tried (like the greedy
+# search), moving at most REPAIR_MAX_MOVES of the students that already had a group
+REPAIR = False
+REPAIR_MAX_MOVES = 10
 # END OF ADJUSTING
 ###########################################
 
 
-class Student:
+class Students:
     """
-    Class representing a student
-    Taken from the original script
+    Class representing all students in a compact columnar way
+
+    Every attribute that is used for the diversity score is factorized
+    into small integer category codes (held in a numpy array), so comparing
+    two students is a cheap integer comparison instead of a string comparison.
+    A student is identified by its position (row) in the dataframe, a group
+    is therefore simply an array of these positions
+
+    The categories of all attributes are also numbered through (flat codes),
+    so that the category counts of all attributes fit into one count matrix
+    (one column per category, i.e. a one-hot encoding of all attributes)
     """
 
-    def __init__(self, index, study, gender, nat):
-        self.index, self.study, self.gender, self.nationality = (
-            index,
-            study,
-            gender,
-            nat,
-        )
+    def __init__(self, codes, categories, weights=None, flat_codes=None):
+        # codes has the shape (n_attributes, n_students)
+        self.codes = codes
+        # the original values for every category code (one list per attribute)
+        self.categories = categories
+        self.n_categories = np.array([len(c) for c in categories], dtype=np.intp)
+        # the weight of every attribute (default: 1 for every attribute)
+        if weights is None:
+            weights = np.ones(len(categories))
+        self.weights = np.asarray(weights, dtype=np.float64)
+        # the first flat code of every attribute
+        self.offsets = np.concatenate([[0], np.cumsum(self.n_categories)[:-1]])
+        if flat_codes is None:
+            flat_codes = codes.astype(np.intp) + self.offsets[:, None]
+        self.flat_codes = flat_codes
+        self.n_total = int(self.n_categories.sum())
+        # the weight of every flat code
+        self.category_weights = np.repeat(self.weights, self.n_categories)
 
-    def __str__(self):
-        return (
-            str(self.index)
-            + ", "
-            + self.study
-            + ", "
-            + self.gender
-            + ", "
-            + self.nationality
-        )
+    def __len__(self):
+        return self.codes.shape[1]
 
-    def get_orig_data(self, df):
+    @classmethod
+    def from_df(cls, df, config, attributes):
         """
-        Helper function to get the original data
-        from the dataset based upon the index
-        Handy if there is more data than what is saved here in this class
+        Helper function to build the columnar representation once
+        from the (NA-filled) dataframe
+        attributes is either a list of keys of config (all weighted with 1)
+        or a dict of keys of config and their weights
         """
-        return df.loc[self.index]
+        codes, categories = [], []
+        for attribute in attributes:
+            attr_codes, uniques = pd.factorize(df[config[attribute]])
+            codes.append(attr_codes)
+            categories.append(list(uniques))
+        # use the smallest integer type that can hold all category codes
+        dtype = np.min_scalar_type(max(len(c) for c in categories))
+        weights = list(attributes.values()) if isinstance(attributes, dict) else None
+        return cls(np.array(codes, dtype=dtype), categories, weights)
+
+
+class SharedStudents:
+    """
+    Class that puts the code arrays of the students into shared memory,
+    so that the worker processes can use them without getting a copy each
+
+    Only spec (the name of the memory block, the array shapes and the small
+    category lists) is sent to the workers, which then attach to the block
+    with attach_students. The block is removed again with close()
+    """
+
+    def __init__(self, students):
+        arrays = [students.codes, students.flat_codes]
+        size = sum(a.nbytes for a in arrays)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        layout = []
+        offset = 0
+        for a in arrays:
+            view = np.ndarray(a.shape, dtype=a.dtype, buffer=self.shm.buf, offset=offset)
+            view[:] = a
+            layout.append((a.shape, a.dtype.str, offset))
+            offset += a.nbytes
+        self.spec = (self.shm.name, layout, students.categories, students.weights)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def attach_students(spec):
+    """
+    Helper function to get the Students of a SharedStudents spec in a worker process
+    Returns the students and the shared memory block (which must be kept
+    referenced as long as the students are used)
+    """
+    name, layout, categories, weights = spec
+    # the block belongs to the main process, which also removes it
+    # (the workers share the resource tracker of the main process)
+    shm = shared_memory.SharedMemory(name=name)
+    codes, flat_codes = [
+        np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+        for shape, dtype, offset in layout
+    ]
+    return Students(codes, categories, weights, flat_codes), shm
 
 
 def check_duplicates(data, duplicate_type, quit):
@@ -151,24 +368,62 @@ def print_stats(category, df, config, n_groups):
         print(f"{c} - {count[c]} ({round(count[c]/amount*100,0)}%) - {ideal_avg}")
 
 
-def create_rand_group(students, n_groups):
+def create_rand_group(students, n_groups, rng):
     """
     Helper function to create randomized groups according to the
     specified amount of groups
+    Every group is an array holding the positions of its students
+    rng is the numpy random generator of the calling process
     """
     # randomly shuffle (numpy is faster than the built-in random module)
-    np.random.shuffle(students)
-    groups = [[] for _ in range(n_groups)]
+    order = rng.permutation(len(students))
 
     # distribute the students
     # this approach is safer than the initial slicing approach
     # as it prevents assigning students to multiple groups
-    for index, s in enumerate(students):
-        groups[index % n_groups].append(s)
-    return groups
+    # (student number i in the shuffled order goes to group i % n_groups)
+    return [order[g::n_groups].copy() for g in range(n_groups)]
+
 
+def create_stratified_group(students, n_groups, rng):
+    """
+    Helper function to create groups constructively so that every
+    category is spread over the groups as evenly as possible
+    Every group is an array holding the positions of its students
+    rng is the numpy random generator of the calling process
 
-def diversity_score(group):
+    The students are placed one by one, the ones with the rarest traits
+    (the same category counts that print_stats shows) first
+    Every student goes into the group that already holds the fewest students
+    sharing one of its traits, random numbers are only used to break ties
+    The group sizes are the same as in create_rand_group
+    """
+    n_students = len(students)
+    # how often the category of every student occurs in total (per attribute)
+    totals = np.array(
+        [np.bincount(codes)[codes] for codes in students.codes.astype(np.intp)]
+    )
+    # rarest trait first, then the rarest combination of traits, ties at random
+    order = np.lexsort((rng.random(n_students), totals.sum(axis=0), totals.min(axis=0)))
+
+    capacity = np.bincount(np.arange(n_students) % n_groups, minlength=n_groups)
+    sizes = np.zeros(n_groups, dtype=np.intp)
+    counts = np.zeros((n_groups, students.n_total), dtype=np.intp)
+    # the noise is tiny compared to the costs (weighted counts), so it only breaks ties
+    noise = rng.random((n_students, n_groups)) * 1e-6
+    assignment = np.empty(n_students, dtype=np.intp)
+    for i, student in enumerate(order):
+        flat = students.flat_codes[:, student]
+        cost = counts[:, flat] @ students.weights
+        cost += noise[i] + np.where(sizes < capacity, 0, np.inf)
+        g = np.argmin(cost)
+        assignment[student] = g
+        sizes[g] += 1
+        counts[g, flat] += 1
+    return assignment_to_groups(assignment, n_groups)
+
+
+def diversity_score(group, students):
     """
     Helper function to calculate the diversity score of a given group
     Taken and adapted from https://stackoverflow.com/a/73738016
@@ -177,33 +432,1106 @@ def diversity_score(group):
     a "penalty" is introduced.
     That means that a group that is perfectly diverse would get a score of 0
     and all other groups a score of < 0
+
+    Instead of comparing every pair of students the penalty is calculated
+    from the category counts: a category that occurs c times in the group
+    is shared by c * (c - 1) / 2 pairs of students (times the weight of its attribute)
+    """
+    counts = np.bincount(students.flat_codes[:, group].ravel(), minlength=students.n_total)
+    return -float((counts * (counts - 1) // 2) @ students.category_weights)
+
+
+def groups_to_assignment(groups, n_students):
+    """
+    Helper function to convert a list of groups (arrays of student positions)
+    into a single array that holds the group id of every student
+    """
+    assignment = np.empty(n_students, dtype=np.intp)
+    for group_id, group in enumerate(groups):
+        assignment[group] = group_id
+    return assignment
+
+
+def group_counts(assignment, students, n_groups):
+    """
+    Helper function to count how often every category occurs in every group
+    Returns one count matrix of shape (n_groups, n_categories of all attributes)
+
+    The group id and the flat category code are combined into a single index
+    so that one np.bincount call is enough for all attributes
+    """
+    flat = (assignment * students.n_total + students.flat_codes).ravel()
+    counts = np.bincount(flat, minlength=n_groups * students.n_total)
+    return counts.reshape(n_groups, students.n_total)
+
+
+def partition_scores(assignment, students, n_groups):
+    """
+    Helper function to calculate the diversity score of every group
+    of a whole group split in one vectorized pass
+    Gives the same numbers as calling diversity_score for every group
+    """
+    counts = group_counts(assignment, students, n_groups)
+    return -((counts * (counts - 1) // 2) @ students.category_weights)
+
+
+def score_groups(groups, students):
+    """
+    Helper function to calculate the diversity scores of a list of groups
+    """
+    assignment = groups_to_assignment(groups, len(students))
+    return partition_scores(assignment, students, len(groups))
+
+
+def score_bound(students, n_groups):
+    """
+    Helper function to calculate the best diversity score (mean over the groups)
+    that any group split can possibly reach
+    No group split can score higher, so the search can stop once it is reached
+
+    The score of every attribute is bounded on its own: a category that occurs
+    t times causes the fewest shared pairs if it is spread as evenly as possible,
+    i.e. t % n_groups groups get t // n_groups + 1 and all others t // n_groups
+    """
+    penalty = 0
+    for codes, weight in zip(students.codes, students.weights):
+        q, r = np.divmod(np.bincount(codes), n_groups)
+        pairs = (r * (q + 1) * q // 2 + (n_groups - r) * q * (q - 1) // 2).sum()
+        penalty += weight * float(pairs)
+    return -penalty / n_groups
+
+
+def bound_reached(score, target):
+    """
+    Helper function to check if a (mean) diversity score has reached the target
+    (with a small margin for the rounding of the mean)
+    """
+    return score >= target - 1e-9
+
+
+class StopCriteria:
+    """
+    Class holding the conditions on which a search phase stops
+    (any combination of them, None = condition not used)
+    - t_end: the time at which the phase stops (deadline)
+    - target: the diversity score at which the phase stops
+    - max_evals: the amount of evaluations after which the phase stops
+    - patience_evals: stop if the best score did not improve for this many evaluations
+    - patience_time: stop if the best score did not improve for this many seconds
+
+    The object is small, so it is sent to every worker which then checks
+    the conditions on its own
+    """
+
+    def __init__(
+        self,
+        t_end=None,
+        target=None,
+        max_evals=None,
+        patience_evals=None,
+        patience_time=None,
+    ):
+        self.t_end = t_end
+        self.target = target
+        self.max_evals = max_evals
+        self.patience_evals = patience_evals
+        self.patience_time = patience_time
+        self.reason = None
+        self.start()
+
+    def start(self):
+        """
+        Helper function to reset the counters (at the start of a phase)
+        """
+        self.t_start = time.time()
+        self.n_evals = 0
+        self.best_score = -np.inf
+        self.last_eval = 0
+        self.last_time = self.t_start
+
+    def split(self, n_workers):
+        """
+        Helper function to get the criteria for one of n_workers workers
+        (the evaluation limit is shared between the workers)
+        """
+        max_evals = self.max_evals
+        if max_evals is not None:
+            max_evals = -(-max_evals // n_workers)
+        return StopCriteria(
+            self.t_end, self.target, max_evals, self.patience_evals, self.patience_time
+        )
+
+    def update(self, score, n_evals=1):
+        """
+        Helper function to report n_evals more evaluations and the best score
+        Returns True if the score is an improvement
+        """
+        self.n_evals += n_evals
+        if score > self.best_score:
+            self.best_score = score
+            self.last_eval = self.n_evals
+            self.last_time = time.time()
+            return True
+        return False
+
+    def progress(self):
+        """
+        Helper function to get how much of the deadline / evaluation limit
+        is used up (between 0 and 1)
+        """
+        fractions = [0.0]
+        if self.t_end is not None:
+            duration = max(self.t_end - self.t_start, 1e-9)
+            fractions.append((time.time() - self.t_start) / duration)
+        if self.max_evals is not None:
+            fractions.append(self.n_evals / max(self.max_evals, 1))
+        return min(max(fractions), 1.0)
+
+    def done(self):
+        """
+        Helper function to check if any of the conditions is met
+        The met condition is saved in reason
+        """
+        now = time.time()
+        if self.target is not None and bound_reached(self.best_score, self.target):
+            self.reason = "target score reached"
+        elif self.max_evals is not None and self.n_evals >= self.max_evals:
+            self.reason = "evaluation limit reached"
+        elif self.t_end is not None and now >= self.t_end:
+            self.reason = "time is up"
+        elif (
+            self.patience_evals is not None
+            and self.n_evals - self.last_eval >= self.patience_evals
+        ) or (
+            self.patience_time is not None and now - self.last_time >= self.patience_time
+        ):
+            self.reason = "no more improvement"
+        else:
+            return False
+        return True
+
+
+class BudgetMonitor:
+    """
+    Class that decides when the search hands the rest of its time over to the
+    greedy search (ADAPT_BUDGET)
+    check() is called regularly with the best score of the search, which is stopped
+    once its improvement per second over the last window seconds is less than
+    ratio times greedy_rate (the improvement per second of the greedy swapping)
+    """
+
+    def __init__(self, greedy_rate, window, ratio):
+        self.greedy_rate = greedy_rate
+        self.window = window
+        self.ratio = ratio
+        # the best score over time (only the points of the last window)
+        self.history = []
+        self.search_rate = None
+        self.reason = None
+
+    def check(self, best_score):
+        """
+        Helper function to report the best score of the search
+        Returns True if the search should stop (the reason is saved in reason)
+        """
+        now = time.time()
+        history = self.history
+        history.append((now, best_score))
+        while len(history) > 1 and now - history[1][0] >= self.window:
+            history.pop(0)
+        t_0, score_0 = history[0]
+        if now - t_0 < self.window or not np.isfinite(score_0):
+            return False
+        self.search_rate = (best_score - score_0) / (now - t_0)
+        if self.search_rate >= self.ratio * self.greedy_rate:
+            return False
+        self.reason = "the search improves slower than the greedy search"
+        return True
+
+
+def greedy_rate(students, n_groups, create_groups, rng):
+    """
+    Helper function to measure how fast the greedy swapping improves a group split
+    (for the BudgetMonitor): one round of maybe_swap over all pairs of groups of a
+    group split created with create_groups
+    Returns the improvement of the diversity score per second
+    """
+    state = GroupState(create_groups(students, n_groups, rng), students)
+    score = state.mean_score()
+    t_start = time.perf_counter()
+    for g_1 in range(n_groups):
+        for g_2 in range(g_1 + 1, n_groups):
+            maybe_swap(state, g_1, g_2)
+    return (state.mean_score() - score) / max(time.perf_counter() - t_start, 1e-9)
+
+
+class Telemetry:
+    """
+    Class collecting statistics about a run
+    - phases: the time spent in every phase (in seconds)
+    - counters: amounts, e.g. of evaluations and of accepted swaps
+    - workers: the statistics of every worker of the search pool
+    - curve: the best diversity score over time
+    """
+
+    def __init__(self):
+        self.t_start = time.time()
+        self.phases = {}
+        self.counters = {}
+        self.workers = []
+        self.curve = []
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Helper function to time a phase (used as 'with telemetry.phase(name):')
+        """
+        t_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - t_start)
+
+    def add_time(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + int(n)
+
+    def record(self, score, phase, t=None):
+        """
+        Helper function to add a point to the best score over time curve
+        (t is the time.time() of the point, default: now)
+        """
+        t = time.time() if t is None else t
+        self.curve.append((t - self.t_start, phase, float(score)))
+
+    def add_workers(self, stats, t_submit, t_received):
+        """
+        Helper function to add the statistics sent back by the search workers
+        t_submit is the time the tasks were submitted and t_received the
+        time all results were received
+        """
+        for i, s in enumerate(stats):
+            elapsed = s["end"] - s["start"]
+            self.workers.append(
+                {
+                    "worker": i,
+                    "evals": s["evals"],
+                    "seconds": elapsed,
+                    "evals_per_s": s["evals"] / max(elapsed, 1e-9),
+                    "create_s": s.get("create_s"),
+                    "score_s": s.get("score_s"),
+                    "accepted": s.get("accepted"),
+                }
+            )
+            self.count("search evaluations", s["evals"])
+            if "accepted" in s:
+                self.count("search swaps accepted", s["accepted"])
+            if "migrations" in s:
+                self.count("search migrations received", s["migrations"])
+            if "create_s" in s:
+                self.add_time("search: creating splits (all workers)", s["create_s"])
+                self.add_time("search: scoring (all workers)", s["score_s"])
+        # only the points where the best score of all workers improved
+        best = -np.inf
+        for t, score in sorted(p for s in stats for p in s["curve"]):
+            if score > best:
+                best = score
+                self.record(score, "search", t)
+        self.add_time("search: pool startup", min(s["start"] for s in stats) - t_submit)
+        self.add_time("search: result transfer", t_received - max(s["end"] for s in stats))
+
+    def summary(self):
+        """
+        Helper function to print a short summary
+        """
+        for name, seconds in self.phases.items():
+            print(f"{name}: {seconds:.2f} s")
+        for name, n in self.counters.items():
+            print(f"{name}: {n}")
+        for w in self.workers:
+            print(f"worker {w['worker']}: {w['evals_per_s']:.0f} evaluations per second")
+
+    def export(self, path):
+        """
+        Helper function to write all statistics to a .json or .csv file
+        """
+        if path.endswith(".csv"):
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["section", "name", "time", "value"])
+                for name, seconds in self.phases.items():
+                    writer.writerow(["phase", name, "", seconds])
+                for name, n in self.counters.items():
+                    writer.writerow(["counter", name, "", n])
+                for w in self.workers:
+                    for key, value in w.items():
+                        if key != "worker" and value is not None:
+                            writer.writerow(["worker", f"{w['worker']}.{key}", "", value])
+                for t, phase, score in self.curve:
+                    writer.writerow(["curve", phase, t, score])
+        else:
+            data = {
+                "phases": self.phases,
+                "counters": self.counters,
+                "workers": self.workers,
+                "curve": [
+                    {"time": t, "phase": phase, "score": score}
+                    for t, phase, score in self.curve
+                ],
+            }
+            with open(path, "w") as f:
+                json.dump(data, f, indent=2)
+
+
+# increase this if the content of the checkpoint files changes
+CHECKPOINT_VERSION = 1
+
+
+class Checkpoint:
+    """
+    Class that saves the best group split found so far to a json file: the student
+    number and group id of every student, the diversity score and some information
+    about the run (metadata)
+    The file is written at most every interval seconds (and with save())
+    and only when the score has improved since the last time
+
+    total_runtime_s in the metadata is the time of all runs that continued
+    from this checkpoint (prior_s is the time of the earlier runs)
+
+    If protect is set (the run did not continue from the file), a checkpoint of an
+    earlier run in path is not lost: one of the same students with a better score
+    is only overwritten once this run is better, and one of other students
+    (or another amount of groups) is kept as path + ".bak"
+    """
+
+    def __init__(self, path, keys, interval, metadata, prior_s=0.0, protect=True):
+        self.path = path
+        self.keys = keys
+        self.interval = interval
+        self.metadata = metadata
+        self.prior_s = prior_s
+        self.t_start = self.t_saved = time.time()
+        self.best_score = self.saved_score = -np.inf
+        self.best_assignment = None
+        # the earlier checkpoint: "other" (to back up) or its score (to beat)
+        self.earlier = None
+        if protect and os.path.isfile(path):
+            self.earlier = "other"
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+                if (
+                    data.get("version") == CHECKPOINT_VERSION
+                    and data["metadata"].get("n_groups") == metadata.get("n_groups")
+                    and set(data["students"]) == set(keys)
+                ):
+                    self.saved_score = data["score"]
+                    self.earlier = "better"
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+
+    def update(self, score, assignment):
+        """
+        Helper function to report a group split (the group id of every student)
+        It is saved if the last save is at least interval seconds ago
+        """
+        if score > self.best_score:
+            self.best_score = score
+            self.best_assignment = assignment
+        if time.time() - self.t_saved >= self.interval:
+            self.save()
+
+    def save(self):
+        """
+        Helper function to save the best reported group split (if it improved)
+        Returns True if the file was written
+        """
+        self.t_saved = time.time()
+        if self.best_assignment is None or self.best_score <= self.saved_score:
+            if self.earlier == "better" and self.best_assignment is not None:
+                print(f"The checkpoint in '{self.path}' has a better score, it is not overwritten")
+                self.earlier = None
+            return False
+        if self.earlier == "other":
+            print(f"Keeping the checkpoint of an earlier run as '{self.path}.bak'")
+            os.replace(self.path, f"{self.path}.bak")
+        self.earlier = None
+        metadata = dict(self.metadata)
+        metadata["saved_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        metadata["total_runtime_s"] = self.prior_s + self.t_saved - self.t_start
+        data = {
+            "version": CHECKPOINT_VERSION,
+            "score": float(self.best_score),
+            "metadata": metadata,
+            "students": self.keys,
+            "groups": np.asarray(self.best_assignment).tolist(),
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+        self.saved_score = self.best_score
+        return True
+
+
+def read_checkpoint(path):
+    """
+    Helper function to read a checkpoint file
+    Returns None (with the reason printed) if there is none or if it is outdated
+    """
+    if not os.path.isfile(path):
+        print(f"No checkpoint found in '{path}'")
+        return None
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("version") != CHECKPOINT_VERSION:
+        print(f"The checkpoint in '{path}' was written by another version")
+        return None
+    return data
+
+
+def load_checkpoint(path, keys, n_groups):
+    """
+    Helper function to load the group split of a checkpoint for the students
+    with the student numbers keys (in this order)
+    Returns the group id of every student and the content of the file,
+    or None (with the reason printed) if the checkpoint does not fit
+    """
+    data = read_checkpoint(path)
+    if data is None:
+        print("Starting from scratch")
+        return None
+    groups = dict(zip(data["students"], data["groups"]))
+    if len(set(keys)) != len(keys) or set(keys) != set(groups):
+        print("The checkpoint holds other students than the input file, starting from scratch")
+        return None
+    assignment = np.array([groups[k] for k in keys], dtype=np.intp)
+    if data["metadata"].get("n_groups") != n_groups or len(np.unique(assignment)) != n_groups:
+        print("The checkpoint has another amount of groups, starting from scratch")
+        return None
+    return assignment, data
+
+
+def create_rand_batch(students, n_groups, batch_size, rng):
+    """
+    Helper function to create batch_size random group splits at once
+    (with the same rule as create_rand_group)
+    Returns the group id of every student for every split, shape (batch_size, n_students),
+    and the shuffled student order of every split
+    """
+    n_students = len(students)
+    order = rng.permuted(np.broadcast_to(np.arange(n_students), (batch_size, n_students)), axis=1)
+    # student number i in the shuffled order goes to group i % n_groups
+    assignments = np.empty((batch_size, n_students), dtype=np.intp)
+    np.put_along_axis(assignments, order, np.arange(n_students) % n_groups, axis=1)
+    return assignments, order
+
+
+def batch_scores(assignments, students, n_groups):
+    """
+    Helper function to calculate the diversity score (mean over the groups)
+    of a whole batch of group splits at once
+    Gives the same numbers as np.mean(partition_scores(...)) for every split
+
+    The split number, the group id and the flat category code are combined
+    into a single index, so one np.bincount call counts all splits
+    """
+    batch_size = assignments.shape[0]
+    n_total = students.n_total
+    offsets = (np.arange(batch_size)[:, None] * n_groups + assignments) * n_total
+    flat = (offsets[:, None, :] + students.flat_codes[None, :, :]).ravel()
+    counts = np.bincount(flat, minlength=batch_size * n_groups * n_total)
+    counts = counts.reshape(batch_size, n_groups, n_total)
+    return -((counts * (counts - 1) // 2) @ students.category_weights).mean(axis=1)
+
+
+def mix64(x):
+    """
+    Helper function to scramble an array of 64 bit integers (splitmix64 finalizer)
+    (the multiplications wrap around, as intended)
     """
-    # initial score (and potential best score)
-    score = 0
-    for i, student_1 in enumerate(group):
-        for student_2 in group[i + 1 :]:
-            # remember that True = 1 and False = 0
-            # the 3 diversity factors (these are set in the Student class)
-            score -= student_1.study == student_2.study
-            score -= student_1.gender == student_2.gender
-            score -= student_1.nationality == student_2.nationality
-    return score
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
 
 
-def mp_wrapper(students, n_groups):
+@functools.lru_cache(maxsize=8)
+def hash_multipliers(n_students):
+    """
+    Helper function to get one fixed random odd 64 bit multiplier per student
+    (the same in every process, so keys of different workers can be compared)
+    """
+    return mix64(np.arange(1, n_students + 1, dtype=np.uint64)) | np.uint64(1)
+
+
+def hash_rows(rows):
+    """
+    Helper function to get a 64 bit key for every row of a 2d array of group ids
+    in one vectorized pass (a weighted sum with random multipliers, scrambled)
+    """
+    rows = np.asarray(rows, dtype=np.uint64)
+    return mix64(rows @ hash_multipliers(rows.shape[1]))
+
+
+def batch_partition_keys(assignments, order, n_groups):
+    """
+    Helper function to get the keys (see partition_key) of a batch of
+    group splits created by create_rand_batch
+    """
+    batch_size, n_students = order.shape
+    # the first (lowest) student of every group, which is the smallest student
+    # among the positions g, g + n_groups, g + 2 * n_groups... of the shuffled order
+    per_group = -(-n_students // n_groups)
+    padded = np.full((batch_size, per_group * n_groups), n_students)
+    padded[:, :n_students] = order
+    first = padded.reshape(batch_size, per_group, n_groups).min(axis=1)
+    relabel = np.argsort(np.argsort(first, axis=1), axis=1).astype(np.uint16)
+    canonical = np.take_along_axis(relabel, assignments, axis=1)
+    return hash_rows(canonical)
+
+
+def partition_key(assignment):
+    """
+    Helper function to get a 64 bit key that identifies a group split
+    Used to count how often the same group split was sampled twice
+
+    The group ids are renumbered in the order in which they first occur,
+    so the key does not depend on the order of the groups
+    (hash_rows is used because python's hash() differs between processes)
+    """
+    _, first = np.unique(assignment, return_index=True)
+    relabel = np.empty(len(first), dtype=np.uint16)
+    relabel[np.argsort(first)] = np.arange(len(first))
+    return int(hash_rows(relabel[assignment][None, :])[0])
+
+
+# the most keys a DuplicateSample holds
+DUPLICATE_SAMPLE = 4096
+
+
+class DuplicateSample:
+    """
+    Class counting how often the same group split is sampled twice,
+    with a bounded amount of memory (at most size keys)
+
+    Only the keys whose highest level bits are all 0 are kept, together with
+    how often they were sampled. This selects the same share (2 ** -level) of all
+    possible group splits in every worker, so a split that is sampled twice is
+    either counted both times or not at all. Once more than size keys are
+    kept, the level is raised, which drops around half of them
+    As long as the level is 0, every key is kept and the count is exact
+    """
+
+    def __init__(self, size=DUPLICATE_SAMPLE):
+        self.size = size
+        self.level = 0
+        self.counts = {}
+
+    def add(self, keys):
+        """
+        Helper function to add the keys of sampled group splits
+        """
+        keys = np.asarray(keys, dtype=np.uint64)
+        if self.level > 0:
+            keys = keys[keys >> np.uint64(64 - self.level) == 0]
+        counts = self.counts
+        for key in keys.tolist():
+            counts[key] = counts.get(key, 0) + 1
+        while len(counts) > self.size:
+            self.level += 1
+            limit = 1 << (64 - self.level)
+            counts = {k: c for k, c in counts.items() if k < limit}
+        self.counts = counts
+
+    def result(self):
+        """
+        Helper function to get the sample in a compact form (to send it back
+        from a worker): the level, the kept keys and how often they were sampled
+        """
+        keys = np.fromiter(self.counts.keys(), dtype=np.uint64, count=len(self.counts))
+        counts = np.fromiter(self.counts.values(), dtype=np.int64, count=len(self.counts))
+        return self.level, keys, counts
+
+
+class SharedDuplicates:
+    """
+    Class that holds the DuplicateSample results of the search workers
+    in shared memory, so that a worker only sends back scalar counts
+
+    Every worker stores its sample with store_duplicates at the end of its
+    search, into the next free one of the n_slots slots. Only spec is sent to the
+    workers, the main process reads the stored samples with samples()
+    The block is removed again with close()
+    """
+
+    def __init__(self, n_slots, size=DUPLICATE_SAMPLE):
+        # per slot: the keys, their counts, the level and the amount of keys
+        self.shm = shared_memory.SharedMemory(create=True, size=n_slots * (2 * size + 2) * 8)
+        self.n_stored = multiprocessing.Value("i", 0)
+        self.spec = (self.shm.name, n_slots, size, self.n_stored)
+
+    def samples(self):
+        """
+        Helper function to get the stored samples (as DuplicateSample.result())
+        """
+        keys, counts, info = duplicate_arrays(self.shm, *self.spec[1:3])
+        return [
+            (int(level), keys[i, :n].copy(), counts[i, :n].copy())
+            for i, (level, n) in enumerate(info[: self.n_stored.value])
+        ]
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def duplicate_arrays(shm, n_slots, size):
+    """
+    Helper function to get the arrays of the slots of a SharedDuplicates block
+    """
+    keys = np.ndarray((n_slots, size), dtype=np.uint64, buffer=shm.buf)
+    counts = np.ndarray((n_slots, size), dtype=np.int64, buffer=shm.buf, offset=keys.nbytes)
+    info = np.ndarray((n_slots, 2), dtype=np.int64, buffer=shm.buf, offset=2 * keys.nbytes)
+    return keys, counts, info
+
+
+def estimate_duplicates(samples, n_evals):
+    """
+    Helper function to estimate how many of the n_evals sampled group splits
+    were already sampled before (by the same or another worker), given the
+    results of the DuplicateSample of every worker
+    The estimate is exact as long as no sample had to drop keys
+    """
+    level = max(sample[0] for sample in samples)
+    keys = np.concatenate([sample[1] for sample in samples])
+    counts = np.concatenate([sample[2] for sample in samples])
+    # only compare the keys that every sample kept
+    if level > 0:
+        kept = keys >> np.uint64(64 - level) == 0
+        keys, counts = keys[kept], counts[kept]
+    n_sampled = counts.sum()
+    if n_sampled == 0:
+        return 0
+    n_duplicates = n_sampled - len(np.unique(keys))
+    if level == 0:
+        return int(n_duplicates)
+    # the share of duplicates in the sample, scaled to all sampled splits
+    return round(n_evals * n_duplicates / n_sampled)
+
+
+def mp_wrapper(students, n_groups, seed, create_groups=create_rand_group):
     """
     Helper function that is used for the multiprocessing
     It creates a random group and then returns the diversity score
     together with the group distribution itself
+    create_groups is the function used to create the group split
 
     The diversity score of a group split is the mean of the diversity
     scores of all groups in it
     """
-    groups = create_rand_group(students, n_groups)
-    mean_scores = [diversity_score(g) for g in groups]
+    groups = create_groups(students, n_groups, np.random.default_rng(seed))
+    mean_scores = score_groups(groups, students)
     return [np.mean(mean_scores), groups, mean_scores]
 
 
+def assignment_to_groups(assignment, n_groups):
+    """
+    Helper function to convert an array holding the group id of every
+    student back into a list of groups (arrays of student positions)
+    """
+    order = np.argsort(assignment, kind="stable")
+    sizes = np.bincount(assignment, minlength=n_groups)
+    return np.split(order, np.cumsum(sizes)[:-1])
+
+
+# the students of a worker process of the search pool (and the shared memory
+# block that holds them), the function the worker uses to create group splits,
+# the event that is set once any worker has reached the target score
+# (so that all workers stop) and how many random group splits are created at once
+# (set once per worker by init_worker instead of being sent with every task)
+_WORKER_STUDENTS = None
+_WORKER_SHM = None
+_WORKER_CREATE_GROUPS = None
+_WORKER_STOP = None
+_WORKER_BATCH_SIZE = 1
+_WORKER_MIGRANTS = None
+_WORKER_START = None
+_WORKER_PROGRESS = None
+_WORKER_DUPLICATES = None
+_WORKER_BEST = None
+
+
+def init_worker(
+    shared_spec,
+    create_groups=create_rand_group,
+    stop=None,
+    batch_size=1,
+    migrants=None,
+    start=None,
+    progress=None,
+    duplicates_spec=None,
+    best=None,
+):
+    """
+    Helper function that is run once in every worker process of the search pool
+    shared_spec is the spec of the SharedStudents holding the students
+    migrants are the queues of the islands (SEARCH_MODE = "island")
+    start is the group split (as group ids) the search continues from (RESUME)
+    progress is the queue and the interval (in seconds) in which the workers
+    send their best split to the main process (for the checkpoints)
+    duplicates_spec is the spec of the SharedDuplicates for the duplicate samples
+    best is the shared value that holds the best score of all workers (ADAPT_BUDGET)
+    """
+    global _WORKER_STUDENTS, _WORKER_SHM, _WORKER_CREATE_GROUPS, _WORKER_STOP
+    global _WORKER_BATCH_SIZE, _WORKER_MIGRANTS, _WORKER_START, _WORKER_PROGRESS
+    global _WORKER_DUPLICATES, _WORKER_BEST
+    _WORKER_STUDENTS, _WORKER_SHM = attach_students(shared_spec)
+    students = _WORKER_STUDENTS
+    _WORKER_CREATE_GROUPS = create_groups
+    _WORKER_STOP = stop if stop is not None else multiprocessing.Event()
+    # limit a batch to around 2 million student entries
+    _WORKER_BATCH_SIZE = max(1, min(batch_size, 2_000_000 // len(students)))
+    _WORKER_MIGRANTS = migrants
+    _WORKER_START = None if start is None else start.astype(np.intp)
+    _WORKER_PROGRESS = progress
+    _WORKER_BEST = best
+    if duplicates_spec is not None:
+        name, n_slots, size, n_stored = duplicates_spec
+        shm = shared_memory.SharedMemory(name=name)
+        _WORKER_DUPLICATES = (shm, duplicate_arrays(shm, n_slots, size), n_stored)
+
+
+def store_duplicates(duplicates):
+    """
+    Helper function to store the DuplicateSample duplicates of a worker
+    in the next free slot of the SharedDuplicates block
+    """
+    if _WORKER_DUPLICATES is None:
+        return
+    _, (keys, counts, info), n_stored = _WORKER_DUPLICATES
+    with n_stored.get_lock():
+        slot = n_stored.value
+        n_stored.value += 1
+    level, sample_keys, sample_counts = duplicates.result()
+    keys[slot, : len(sample_keys)] = sample_keys
+    counts[slot, : len(sample_counts)] = sample_counts
+    info[slot] = level, len(sample_keys)
+
+
+# the most points of the best score over time curve that a worker sends back
+CURVE_POINTS = 200
+
+
+def add_curve_point(curve, score):
+    """
+    Helper function to add a point (now, score) to the best score over time curve
+    of a worker. Once the curve has more than CURVE_POINTS points, every second
+    point is dropped (but never the last one), so it stays the same size in long runs
+    The score is also shared with the main process (for the BudgetMonitor)
+    """
+    curve.append((time.time(), score))
+    if len(curve) > CURVE_POINTS:
+        curve[:-1] = curve[:-1:2]
+    if _WORKER_BEST is not None:
+        with _WORKER_BEST.get_lock():
+            _WORKER_BEST.value = max(_WORKER_BEST.value, score)
+
+
+def first_groups(students, n_groups, rng):
+    """
+    Helper function to get the first group split of a worker: the split the search
+    continues from (RESUME), otherwise a new one from the worker's create_groups
+    """
+    if _WORKER_START is not None:
+        return assignment_to_groups(_WORKER_START, n_groups)
+    return _WORKER_CREATE_GROUPS(students, n_groups, rng)
+
+
+def report_best(t_report, score, assignment):
+    """
+    Helper function to send the best split of a worker to the main process
+    (for the checkpoints) once the time t_report is reached
+    Returns the time of the next report
+    """
+    now = time.time()
+    if _WORKER_PROGRESS is None or now < t_report or assignment is None:
+        return t_report
+    progress, interval = _WORKER_PROGRESS
+    progress.put((score, assignment.astype(np.uint16)))
+    return now + interval
+
+
+def end_reports():
+    """
+    Helper function to call at the end of a worker's search, so that reports
+    that the main process did not take anymore do not block the exit of the worker
+    """
+    if _WORKER_PROGRESS is not None:
+        _WORKER_PROGRESS[0].cancel_join_thread()
+
+
+def batch_worker(n_groups, seed):
+    """
+    Helper function for one task of the batch search (SEARCH_MODE = "batch")
+    It creates one group split with the worker's create_groups function
+    and only sends back its diversity score and the group id of every student
+    """
+    students = _WORKER_STUDENTS
+    groups = _WORKER_CREATE_GROUPS(students, n_groups, np.random.default_rng(seed))
+    assignment = groups_to_assignment(groups, len(students))
+    score = np.mean(partition_scores(assignment, students, n_groups))
+    return score, assignment.astype(np.uint16)
+
+
+def search_worker(n_groups, stop, seed):
+    """
+    Helper function that runs the random search inside a worker process
+    until the StopCriteria stop are met, or until any worker has reached
+    the target score
+    seed is the SeedSequence of the worker's own random stream
+
+    Only the best score, the best group split (as a compact array holding
+    the group id of every student), the amount of tried group splits
+    and some statistics (for the Telemetry, with at most CURVE_POINTS points
+    of the curve) are sent back, so the result has the same size in long runs
+    The DuplicateSample of the tried group splits is stored in shared memory
+    (store_duplicates) instead
+
+    Random group splits (create_rand_group) are created and scored in
+    batches of _WORKER_BATCH_SIZE splits, other ones one by one
+    """
+    students = _WORKER_STUDENTS
+    rng = np.random.default_rng(seed)
+    best_assignment = None
+    duplicates = DuplicateSample()
+    create_s = score_s = 0.0
+    curve = []
+    batched = _WORKER_CREATE_GROUPS is create_rand_group and _WORKER_BATCH_SIZE > 1
+    stop.start()
+    t_report = stop.t_start
+    if _WORKER_START is not None:
+        # the split the search continues from is the best one so far
+        best_assignment = _WORKER_START
+        stop.update(np.mean(partition_scores(best_assignment, students, n_groups)), 0)
+    # always try at least one group split
+    while stop.n_evals == 0 or not (_WORKER_STOP.is_set() or stop.done()):
+        t_0 = time.perf_counter()
+        if batched:
+            assignments, order = create_rand_batch(students, n_groups, _WORKER_BATCH_SIZE, rng)
+            t_1 = time.perf_counter()
+            scores = batch_scores(assignments, students, n_groups)
+            score_s += time.perf_counter() - t_1
+            duplicates.add(batch_partition_keys(assignments, order, n_groups))
+            best = np.argmax(scores)
+            score, assignment, n_evals = scores[best], assignments[best], len(scores)
+        else:
+            groups = _WORKER_CREATE_GROUPS(students, n_groups, rng)
+            assignment = groups_to_assignment(groups, len(students))
+            t_1 = time.perf_counter()
+            score = np.mean(partition_scores(assignment, students, n_groups))
+            score_s += time.perf_counter() - t_1
+            duplicates.add([partition_key(assignment)])
+            n_evals = 1
+        create_s += t_1 - t_0
+        if stop.update(score, n_evals):
+            best_assignment = assignment
+            add_curve_point(curve, score)
+            if stop.target is not None and bound_reached(score, stop.target):
+                _WORKER_STOP.set()
+        t_report = report_best(t_report, stop.best_score, best_assignment)
+    end_reports()
+    store_duplicates(duplicates)
+    stats = {
+        "start": stop.t_start,
+        "end": time.time(),
+        "evals": stop.n_evals,
+        "create_s": create_s,
+        "score_s": score_s,
+        "curve": curve,
+    }
+    return stop.best_score, best_assignment.astype(np.uint16), stop.n_evals, stats
+
+
+def pool_search(
+    students,
+    n_groups,
+    stop,
+    n_workers,
+    seed_seq,
+    worker=search_worker,
+    create_groups=create_rand_group,
+    telemetry=None,
+    batch_size=1,
+    elites=None,
+    islands=False,
+    start=None,
+    checkpoint=None,
+    monitor=None,
+):
+    """
+    Helper function for the random search with one process pool
+    for the whole run (SEARCH_MODE = "pool" and "anneal")
+    Every worker gets its own random stream spawned from seed_seq,
+    creates its group splits with create_groups (batch_size random
+    splits at once) and checks the StopCriteria stop on its own
+    All workers stop as soon as one of them has reached the target score
+    The statistics of the workers are added to telemetry (if given)
+    The best group split of every worker is added to the list elites
+    (if given, sorted from the best to the worst score)
+    If islands is set, every worker also gets its index and the migration
+    queues of all workers (SEARCH_MODE = "island")
+    start is the group split (as group ids) every worker continues from (if given)
+    The best splits of the workers are reported to the Checkpoint checkpoint
+    (if given) every checkpoint.interval seconds
+    All workers are stopped once the BudgetMonitor monitor (if given) says so
+    Returns the best score, the best group split, the amount of tried splits
+    and the amount of tried splits that were duplicates (estimated from
+    a DuplicateSample in long runs, None if the worker does not track duplicates)
+    """
+    n_workers = n_workers or os.cpu_count()
+    t_submit = time.time()
+    shared = SharedStudents(students)
+    duplicates = SharedDuplicates(n_workers)
+    migrants = [multiprocessing.Queue() for _ in range(n_workers)] if islands else None
+    progress = None
+    if checkpoint is not None:
+        progress = (multiprocessing.Queue(), checkpoint.interval)
+    stop_all = multiprocessing.Event()
+    best = multiprocessing.Value("d", -np.inf)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=init_worker,
+            initargs=(
+                shared.spec,
+                create_groups,
+                stop_all,
+                batch_size,
+                migrants,
+                start,
+                progress,
+                duplicates.spec,
+                best,
+            ),
+        ) as ex:
+            # (the islands also get their index)
+            args = [[i] if islands else [] for i in range(n_workers)]
+            processes = [
+                ex.submit(worker, n_groups, stop.split(n_workers), s, *a)
+                for s, a in zip(seed_seq.spawn(n_workers), args)
+            ]
+            if checkpoint is not None or monitor is not None:
+                # take the reports of the workers while waiting for the results
+                pending = processes
+                while pending:
+                    pending = wait(pending, timeout=0.5).not_done
+                    while checkpoint is not None:
+                        try:
+                            score, assignment = progress[0].get_nowait()
+                        except queue.Empty:
+                            break
+                        checkpoint.update(score, assignment)
+                    if monitor is not None and not stop_all.is_set():
+                        if monitor.check(best.value):
+                            stop_all.set()
+            results = [p.result() for p in processes]
+            t_received = time.time()
+        samples = duplicates.samples()
+    finally:
+        shared.close()
+        duplicates.close()
+
+    if telemetry is not None:
+        telemetry.add_workers([r[3] for r in results], t_submit, t_received)
+    best_score, best_assignment = max(results, key=lambda r: r[0])[:2]
+    amount_execs = sum(r[2] for r in results)
+    best_group_split = assignment_to_groups(best_assignment.astype(np.intp), n_groups)
+    if elites is not None:
+        for r in sorted(results, key=lambda r: r[0], reverse=True):
+            elites.append(assignment_to_groups(r[1].astype(np.intp), n_groups))
+    if not samples:
+        return best_score, best_group_split, amount_execs, None
+    n_dupl = estimate_duplicates(samples, amount_execs)
+    return best_score, best_group_split, amount_execs, n_dupl
+
+
+def batch_search(
+    students,
+    n_groups,
+    stop,
+    seed_seq,
+    create_groups=create_rand_group,
+    telemetry=None,
+    start=None,
+    checkpoint=None,
+    monitor=None,
+):
+    """
+    Helper function for the random search with a new process pool
+    for every batch of 50 group splits (SEARCH_MODE = "batch")
+    Every task gets its own random stream spawned from seed_seq
+    and creates its group split with create_groups
+    The StopCriteria stop are checked after every batch
+    The improvements of the best score are added to telemetry (if given)
+    The students are shared with the workers through shared memory and
+    every task only sends back its score and its split as group ids
+    start is the group split (as group ids) that is the best one at the start (if given)
+    The best split is reported to the Checkpoint checkpoint (if given) after every batch
+    and the search is stopped once the BudgetMonitor monitor (if given) says so
+    Returns the best score, the best group split, the amount of tried splits
+    and the amount of tried splits that were duplicates (estimated from
+    a DuplicateSample in long runs)
+    """
+    best_score = -10000000
+    best_assignment = None
+    amount_execs = 0
+    duplicates = DuplicateSample()
+    stop.start()
+    if start is not None:
+        best_assignment = start
+        best_score = np.mean(partition_scores(start, students, n_groups))
+    shared = SharedStudents(students)
+    try:
+        while not stop.done():
+            # For the specified amount of time create random groups in
+            # batches of 50 processes at a time and then evaluate
+            # the number 50 is chosen arbitrarily but shouldnt be too high
+            # to avoid performance issues (especially on slower devices)
+            with ProcessPoolExecutor(
+                initializer=init_worker, initargs=(shared.spec, create_groups)
+            ) as ex:
+                processes = [ex.submit(batch_worker, n_groups, s) for s in seed_seq.spawn(50)]
+            # track the amount of executions for more insights
+            amount_execs += 50
+            if telemetry is not None:
+                telemetry.count("search evaluations", 50)
+
+            for p in processes:
+                score, assignment = p.result()
+                duplicates.add([partition_key(assignment)])
+                # check if the result was better than the best score
+                # if so then save the score and the group split
+                if score > best_score:
+                    best_score = score
+                    best_assignment = assignment
+                    if telemetry is not None:
+                        telemetry.record(best_score, "search")
+            stop.update(best_score, 50)
+            if checkpoint is not None:
+                checkpoint.update(best_score, best_assignment)
+            if monitor is not None and monitor.check(best_score):
+                break
+    finally:
+        shared.close()
+    best_group_split = assignment_to_groups(best_assignment.astype(np.intp), n_groups)
+    n_dupl = estimate_duplicates([duplicates.result()], amount_execs)
+    return best_score, best_group_split, amount_execs, n_dupl
+
+
 def stirling_second_kind(n, k):
     """
     Helper function for calculating all possible combinations
@@ -223,34 +1551,124 @@ def stirling_second_kind(n, k):
     return S[n][k]
 
 
-def maybe_swap(group_1, group_2):
+class GroupState:
+    """
+    Class holding a group split for the local search together with
+    the category counts of every group
+
+    Keeping the counts (one matrix for all attributes, see group_counts) around
+    means that the effect of swapping two students can be computed
+    from the counts in O(attributes), instead
+    of recalculating the diversity score of both groups after every swap
+    """
+
+    def __init__(self, groups, students):
+        self.groups = groups
+        self.students = students
+        self.assignment = groups_to_assignment(groups, len(students))
+        self.counts = group_counts(self.assignment, students, len(groups))
+        # the position of every student inside of its group
+        self.position = np.empty(len(students), dtype=np.intp)
+        for group in groups:
+            self.position[group] = np.arange(len(group))
+
+    def swap_delta(self, a, b):
+        """
+        Helper function to get the change of the summed diversity score
+        if student a and student b (in different groups) were swapped
+        """
+        g_a, g_b = self.assignment[a], self.assignment[b]
+        counts = self.counts
+        delta = 0.0
+        for codes, weight in zip(self.students.flat_codes, self.students.weights):
+            c_a, c_b = codes[a], codes[b]
+            if c_a == c_b:
+                continue
+            # group a loses a c_a (=> count - 1 fewer shared pairs)
+            # and gains a c_b (=> count more shared pairs), same for group b
+            pairs = counts[g_a, c_a] - 1 - counts[g_a, c_b]
+            pairs += counts[g_b, c_b] - 1 - counts[g_b, c_a]
+            delta += weight * pairs
+        return float(delta)
+
+    def swap_deltas(self, g_1, g_2):
+        """
+        Helper function to get the score change of every possible swap
+        between group g_1 and group g_2 at once
+        Returns a matrix of shape (len(group_1), len(group_2))
+        """
+        group_1, group_2 = self.groups[g_1], self.groups[g_2]
+        counts = self.counts
+        # flat codes of both groups, shape (n_attributes, group size)
+        c_1 = self.students.flat_codes[:, group_1]
+        c_2 = self.students.flat_codes[:, group_2]
+        # same formula as in swap_delta, split into the part that
+        # depends on the student of group_1 and the one of group_2
+        d_1 = counts[g_1, c_1] - 1 - counts[g_2, c_1]
+        d_2 = counts[g_2, c_2] - 1 - counts[g_1, c_2]
+        same = c_1[:, :, None] == c_2[:, None, :]
+        pairs = np.where(same, 0, d_1[:, :, None] + d_2[:, None, :])
+        return np.tensordot(self.students.weights, pairs, axes=1)
+
+    def swap(self, g_1, i, g_2, j):
+        """
+        Helper function to swap the i-th student of group g_1 with
+        the j-th student of group g_2 and update the counts accordingly
+        """
+        group_1, group_2 = self.groups[g_1], self.groups[g_2]
+        a, b = group_1[i], group_2[j]
+        # the flat codes of a student are all different, so no index occurs twice
+        c_a, c_b = self.students.flat_codes[:, a], self.students.flat_codes[:, b]
+        self.counts[g_1, c_a] -= 1
+        self.counts[g_1, c_b] += 1
+        self.counts[g_2, c_b] -= 1
+        self.counts[g_2, c_a] += 1
+        group_1[i], group_2[j] = b, a
+        self.assignment[a], self.assignment[b] = g_2, g_1
+        self.position[a], self.position[b] = j, i
+
+    def swap_students(self, a, b):
+        """
+        Helper function to swap student a and student b (in different groups)
+        """
+        self.swap(self.assignment[a], self.position[a], self.assignment[b], self.position[b])
+
+    def mean_score(self):
+        """
+        Helper function to get the diversity score (mean over the groups) from the counts
+        """
+        counts = self.counts
+        return float(np.mean(-((counts * (counts - 1) // 2) @ self.students.category_weights)))
+
+
+def maybe_swap(state, g_1, g_2, telemetry=None):
     """
     Helper function to see if a swap would increase diversity of the groups
     Taken and adapted from https://stackoverflow.com/a/73738016
+    The first swap (in the order of the students in the groups) that
+    increases the score is applied, the groups are not touched otherwise
+    The checked and accepted swaps are counted in telemetry (if given)
     """
-    diversity_1, diversity_2 = map(diversity_score, [group_1, group_2])
-    old_sum = diversity_1 + diversity_2
-    for _ in range(len(group_1)):  # do this for every student in group_1
-        student_1 = group_1.pop(0)  # provisionally remove from group_1
-        for _ in range(len(group_2)):
-            student_2 = group_2.pop(0)  # provisionally remove from g_2
-            group_1.append(student_2)  # provisionally swap students
-            group_2.append(student_1)
-            diversity_1, diversity_2 = map(diversity_score, [group_1, group_2])
-            new_sum = diversity_1 + diversity_2
-            if new_sum > old_sum:  # see what the new score is
-                return True  # leave the swap intact and return if higher
-            group_2.pop()  # else, remove student_1 from group_2 ...
-            group_2.append(group_1.pop())  # and return student_2 to group_2
-        group_1.append(student_1)  # return student_1 to group_1
-    # no increase so leave w False
-    return False
-
-
-def greedy_assign(groups):
+    deltas = state.swap_deltas(g_1, g_2)
+    # (small margin, so that rounding errors of the weights cannot cause endless swapping)
+    improving = np.flatnonzero(deltas > 1e-9)
+    if telemetry is not None:
+        telemetry.count("greedy swaps checked", deltas.size)
+        telemetry.count("greedy swaps accepted", len(improving) > 0)
+    if len(improving) == 0:
+        # no increase so leave w False
+        return False
+    i, j = divmod(improving[0], deltas.shape[1])
+    state.swap(g_1, i, g_2, j)
+    return True
+
+
+def greedy_assign(groups, students, rng, telemetry=None):
     """
     Helper function to do the greedy swapping
     Taken and adapted from https://stackoverflow.com/a/73738016
+    rng is the numpy random generator used to shuffle the group order
+    The swaps are counted in telemetry (if given)
 
     This function is guaranteed to return because the diversity score
     is only permitted to increase (otherwise we might run into cycles),
@@ -260,16 +1678,419 @@ def greedy_assign(groups):
     # this only shuffles the order of the groups
     # and not actually the people inside the group!
     # this is needed so that the first group is not always the same!
-    np.random.shuffle(groups)
+    rng.shuffle(groups)
+    state = GroupState(groups, students)
     while True:
         has_swapped = False
-        for i, group_1 in enumerate(groups):
-            for group_2 in groups[i + 1 :]:
-                has_swapped = maybe_swap(group_1, group_2) or has_swapped
+        for g_1 in range(len(groups)):
+            for g_2 in range(g_1 + 1, len(groups)):
+                has_swapped = maybe_swap(state, g_1, g_2, telemetry) or has_swapped
         if not has_swapped:
             return groups
 
 
+def greedy_worker(assignment, n_groups, seed):
+    """
+    Helper function for one restart of the greedy swapping search
+    inside a worker process
+    assignment is the start group split (group id of every student), which
+    is a copy so the restarts do not change each other's groups
+    Returns the diversity score, the improved group split (as group ids)
+    and the counted swaps
+    """
+    students = _WORKER_STUDENTS
+    telemetry = Telemetry()
+    groups = assignment_to_groups(assignment.astype(np.intp), n_groups)
+    groups = greedy_assign(groups, students, np.random.default_rng(seed), telemetry)
+    assignment = groups_to_assignment(groups, len(students))
+    score = np.mean(partition_scores(assignment, students, n_groups))
+    return score, assignment.astype(np.uint16), telemetry.counters
+
+
+def greedy_search(
+    students,
+    starts,
+    n_groups,
+    stop,
+    n_runs,
+    t_end,
+    n_workers,
+    seed_seq,
+    telemetry=None,
+    checkpoint=None,
+):
+    """
+    Helper function for the greedy phase with one process pool
+    Runs n_runs independent greedy restarts, each on a copy of one of the
+    group splits in starts (in turns) with its own random stream spawned
+    from seed_seq, and keeps going with more restarts while there is time
+    left until t_end (None = no time left)
+    Stops early once the StopCriteria stop are met
+    (the score of starts[0] must already be reported to stop)
+    The swaps and improvements of the best score are added to telemetry (if given)
+    and the improvements are reported to the Checkpoint checkpoint (if given)
+    Returns the best score and the best group split
+    """
+    n_workers = n_workers or os.cpu_count()
+    best_score, best_group_split = stop.best_score, starts[0]
+    starts = [groups_to_assignment(g, len(students)).astype(np.uint16) for g in starts]
+    shared = SharedStudents(students)
+    ex = ProcessPoolExecutor(
+        max_workers=n_workers, initializer=init_worker, initargs=(shared.spec,)
+    )
+    n_submitted = 0
+
+    def submit(n):
+        nonlocal n_submitted
+        processes = []
+        for s in seed_seq.spawn(n):
+            start = starts[n_submitted % len(starts)]
+            processes.append(ex.submit(greedy_worker, start, n_groups, s))
+            n_submitted += 1
+        return processes
+
+    def rounds():
+        # first the n_runs restarts, then rounds of one restart per worker
+        # as long as there is time left
+        yield from progressbar(submit(n_runs))
+        while t_end is not None and time.time() < t_end:
+            yield from submit(n_workers)
+
+    processes = rounds()
+    try:
+        for p in processes:
+            if stop.done():
+                # (end the progress bar first)
+                processes.close()
+                print(f"Stopping the greedy search early ({stop.reason})")
+                break
+            score, assignment, counters = p.result()
+            if telemetry is not None:
+                for name, n in counters.items():
+                    telemetry.count(name, n)
+            if stop.update(score):
+                best_score = score
+                best_group_split = assignment_to_groups(assignment.astype(np.intp), n_groups)
+                if telemetry is not None:
+                    telemetry.record(score, "greedy")
+                if checkpoint is not None:
+                    checkpoint.update(score, assignment)
+    finally:
+        # the restarts that did not start yet are not needed anymore
+        processes.close()
+        ex.shutdown(cancel_futures=True)
+        shared.close()
+    return best_score, best_group_split
+
+
+def anneal_worker(n_groups, stop, seed):
+    """
+    Helper function that runs a simulated annealing search inside a worker
+    process until the StopCriteria stop are met, or until any worker has
+    reached the target score (SEARCH_MODE = "anneal")
+    seed is the SeedSequence of the worker's own random stream
+
+    Starting from a group split created with the worker's create_groups
+    function, two random students of different groups
+    are swapped if this improves the score, or otherwise with a probability
+    that shrinks with the score loss and with the temperature
+    The temperature is lowered from ANNEAL_T_START to ANNEAL_T_END over the run
+    (i.e. until the deadline or the evaluation limit of stop, whichever comes first)
+    Only swaps are done so the group sizes stay as balanced as in create_rand_group
+
+    Returns the same as search_worker (no duplicate sample is stored, as the
+    amount of tried splits is the amount of evaluated swaps here)
+    """
+    students = _WORKER_STUDENTS
+    rng = np.random.default_rng(seed)
+    state = GroupState(first_groups(students, n_groups, rng), students)
+    # the summed diversity score of all groups
+    score = float(partition_scores(state.assignment, students, n_groups).sum())
+    best_score = score
+    best_assignment = state.assignment.copy()
+    n_accepted = 0
+    curve = []
+    stop.start()
+    t_report = stop.t_start
+    stop.update(best_score / n_groups, 0)
+    add_curve_point(curve, stop.best_score)
+    while not (_WORKER_STOP.is_set() or stop.done()):
+        # geometric cooling schedule, based on the used up share of the time / evaluations
+        temp = ANNEAL_T_START * (ANNEAL_T_END / ANNEAL_T_START) ** stop.progress()
+        # draw the random numbers in blocks instead of one by one
+        pairs = rng.integers(len(students), size=(1000, 2)).tolist()
+        thresholds = (temp * np.log(rng.random(1000))).tolist()
+        n_evals = 0
+        for (a, b), threshold in zip(pairs, thresholds):
+            if state.assignment[a] == state.assignment[b]:
+                continue
+            delta = state.swap_delta(a, b)
+            n_evals += 1
+            # same as accepting with probability exp(delta / temp)
+            if delta >= threshold:
+                state.swap_students(a, b)
+                n_accepted += 1
+                score += delta
+                if score > best_score:
+                    best_score = score
+                    best_assignment = state.assignment.copy()
+        # the stop criteria are checked once per block of swaps
+        if stop.update(best_score / n_groups, n_evals):
+            add_curve_point(curve, stop.best_score)
+        if stop.target is not None and bound_reached(stop.best_score, stop.target):
+            _WORKER_STOP.set()
+        t_report = report_best(t_report, stop.best_score, best_assignment)
+    end_reports()
+    stats = {
+        "start": stop.t_start,
+        "end": time.time(),
+        "evals": stop.n_evals,
+        "accepted": n_accepted,
+        "curve": curve,
+    }
+    return stop.best_score, best_assignment.astype(np.uint16), stop.n_evals, stats
+
+
+def island_worker(n_groups, stop, seed, island):
+    """
+    Helper function that runs the local search of one island inside a worker
+    process until the StopCriteria stop are met, or until any worker has
+    reached the target score (SEARCH_MODE = "island")
+    seed is the SeedSequence of the worker's own random stream and island
+    the index of the worker (its best split is sent to the next island)
+
+    The island holds ISLAND_POPULATION group splits created with the worker's
+    create_groups function, which are improved in turns with maybe_swap on
+    random pairs of groups. A split on which no swap was found for as many pairs
+    in a row as there are pairs of groups is stuck, and is changed with
+    ISLAND_KICK random swaps of students to get out of it
+    Every MIGRATION_INTERVAL seconds the best split of the island is sent to the
+    next island, and the best received split replaces the worst split of the
+    island, or all of them if the island did not improve since the last migration
+
+    Returns the same as anneal_worker
+    """
+    students = _WORKER_STUDENTS
+    rng = np.random.default_rng(seed)
+    n_pairs = n_groups * (n_groups - 1) // 2
+    population = [GroupState(first_groups(students, n_groups, rng), students)]
+    population += [
+        GroupState(_WORKER_CREATE_GROUPS(students, n_groups, rng), students)
+        for _ in range(ISLAND_POPULATION - 1)
+    ]
+    scores = [state.mean_score() for state in population]
+    fails = [0] * len(population)
+    n_accepted = n_migrations = 0
+    curve = []
+    stop.start()
+    best = int(np.argmax(scores))
+    stop.update(scores[best], 0)
+    best_assignment = population[best].assignment.copy()
+    add_curve_point(curve, stop.best_score)
+    last_best = stop.best_score
+    t_migrate = time.time() + MIGRATION_INTERVAL
+    t_report = stop.t_start
+
+    def kick(state):
+        # random swaps of students (pairs in the same group are skipped)
+        for a, b in rng.integers(len(students), size=(ISLAND_KICK, 2)).tolist():
+            if state.assignment[a] != state.assignment[b]:
+                state.swap_students(a, b)
+
+    while not (_WORKER_STOP.is_set() or stop.done()):
+        for m, state in enumerate(population):
+            # one block of random pairs of groups for every split in turns
+            # (the stop criteria are checked after every block)
+            if m > 0 and (_WORKER_STOP.is_set() or stop.done()):
+                break
+            n_evals = 0
+            for g_1, g_2 in rng.integers(n_groups, size=(100, 2)).tolist():
+                if g_1 == g_2:
+                    continue
+                # one evaluation = one pair of groups checked with maybe_swap
+                n_evals += 1
+                if maybe_swap(state, g_1, g_2):
+                    n_accepted += 1
+                    fails[m] = 0
+                else:
+                    fails[m] += 1
+            scores[m] = state.mean_score()
+            if stop.update(scores[m], n_evals):
+                best_assignment = state.assignment.copy()
+                add_curve_point(curve, stop.best_score)
+            if fails[m] >= n_pairs:
+                kick(state)
+                scores[m] = state.mean_score()
+                fails[m] = 0
+        if stop.target is not None and bound_reached(stop.best_score, stop.target):
+            _WORKER_STOP.set()
+        t_report = report_best(t_report, stop.best_score, best_assignment)
+        if time.time() < t_migrate:
+            continue
+        # migration: send the best split to the next island, take the ones that arrived
+        t_migrate = time.time() + MIGRATION_INTERVAL
+        _WORKER_MIGRANTS[(island + 1) % len(_WORKER_MIGRANTS)].put(
+            (stop.best_score, best_assignment.astype(np.uint16))
+        )
+        migrants = []
+        while True:
+            try:
+                migrants.append(_WORKER_MIGRANTS[island].get_nowait())
+            except queue.Empty:
+                break
+        if migrants:
+            n_migrations += 1
+            score, assignment = max(migrants, key=lambda m: m[0])
+            assignment = assignment.astype(np.intp)
+            if stop.best_score > last_best:
+                replaced = [int(np.argmin(scores))]
+            else:
+                replaced = range(len(population))
+            if stop.update(score, 0):
+                best_assignment = assignment
+                add_curve_point(curve, stop.best_score)
+            groups = assignment_to_groups(assignment, n_groups)
+            for m in replaced:
+                population[m] = GroupState([g.copy() for g in groups], students)
+                # (the restarted splits should not all be the same)
+                if m != replaced[0]:
+                    kick(population[m])
+                scores[m] = population[m].mean_score()
+                fails[m] = 0
+        last_best = stop.best_score
+    # splits that were sent but not received anymore must not block the exit
+    for q in _WORKER_MIGRANTS:
+        q.cancel_join_thread()
+    end_reports()
+    stats = {
+        "start": stop.t_start,
+        "end": time.time(),
+        "evals": stop.n_evals,
+        "accepted": n_accepted,
+        "migrations": n_migrations,
+        "curve": curve,
+    }
+    return stop.best_score, best_assignment.astype(np.uint16), stop.n_evals, stats
+
+
+def placed_students(path, labels):
+    """
+    Helper function to get the students in the group state file path (see
+    groupStateFile.py), including the ones that assignRest.py placed into the groups
+    Returns a dict of the student number and group id of every student
+    (empty if there is no state file or if it belongs to other groups)
+    """
+    if path is None or not os.path.isfile(path):
+        return {}
+    try:
+        state = load_state(path)
+    except ValueError as exc:
+        print(f"The group state file is not used: {exc}")
+        return {}
+    if state["labels"] != list(labels):
+        return {}
+    return state["students"]
+
+
+def repair_groups(students, keys, old_keys, old_assignment, n_groups, max_moves):
+    """
+    Helper function to repair the group split of an earlier run (REPAIR)
+    keys are the student numbers of the students, old_keys and old_assignment
+    the student numbers and group ids of the earlier group split
+    - students that are not in keys anymore are left out
+    - every group gets a capacity, so that the sizes are as balanced as in
+      create_rand_group (the largest groups get the extra students)
+    - new students are placed one by one into the group below its capacity where
+      they share the fewest (weighted) traits, ties are broken by the group size
+    - students of groups above their capacity (e.g. next to groups that lost
+      students) are moved to the groups below it, always the student and group
+      that make the score the least worse (these moves are always done)
+    - then swaps between the changed groups and all other groups are tried as in
+      greedy_assign, but at most max_moves students of the earlier split may
+      be moved in total (new students can always be moved)
+    The work depends on the amount of changes, not on the amount of students
+    Returns the repaired group split, the amount of new students,
+    of students that left and of moved students
+    """
+    if len(set(keys)) != len(keys):
+        raise ValueError("The student numbers must be unique to repair a group split")
+    old = dict(zip(old_keys, old_assignment))
+    assignment = np.array([old.get(k, -1) for k in keys], dtype=np.intp)
+    is_new = assignment < 0
+    changed = np.zeros(n_groups, dtype=bool)
+    kept = set(keys)
+    left = [g for k, g in old.items() if k not in kept]
+    changed[left] = True
+
+    # the counts without the new students (they are counted in an extra group)
+    without_new = np.where(is_new, n_groups, assignment)
+    counts = group_counts(without_new, students, n_groups + 1)[:n_groups]
+    sizes = np.bincount(without_new, minlength=n_groups + 1)[:n_groups]
+    capacity = np.full(n_groups, len(keys) // n_groups)
+    capacity[np.argsort(-sizes, kind="stable")[: len(keys) % n_groups]] += 1
+    for i in np.flatnonzero(is_new):
+        codes = students.flat_codes[:, i]
+        # every student of the group with the same category is one more shared pair
+        increase = counts[:, codes] @ students.weights
+        increase[sizes >= capacity] = np.inf
+        candidates = np.flatnonzero(increase <= increase.min() + 1e-9)
+        g = candidates[np.argmin(sizes[candidates])]
+        counts[g, codes] += 1
+        sizes[g] += 1
+        assignment[i] = g
+        changed[g] = True
+
+    moved = np.zeros(len(students), dtype=bool)
+    n_moved = 0
+    while np.any(sizes > capacity):
+        g_1 = np.argmax(sizes - capacity)
+        members = np.flatnonzero(assignment == g_1)
+        targets = np.flatnonzero(sizes < capacity)
+        codes = students.flat_codes[:, members]
+        # the shared pairs that group g_1 loses minus the ones the target group gains
+        pairs = counts[g_1, codes][None] - 1 - counts[targets[:, None, None], codes[None]]
+        deltas = np.tensordot(pairs, students.weights, axes=(1, 0))
+        t, m = np.unravel_index(np.argmax(deltas), deltas.shape)
+        g_2, i = targets[t], members[m]
+        counts[g_1, codes[:, m]] -= 1
+        counts[g_2, codes[:, m]] += 1
+        sizes[g_1] -= 1
+        sizes[g_2] += 1
+        assignment[i] = g_2
+        changed[[g_1, g_2]] = True
+        moved[i] = True
+        n_moved += 1
+
+    state = GroupState(assignment_to_groups(assignment, n_groups), students)
+    # every pair of groups that involves a changed group (once)
+    pairs = [
+        (g_1, g_2)
+        for g_1 in np.flatnonzero(changed)
+        for g_2 in range(n_groups)
+        if g_2 != g_1 and not (changed[g_2] and g_2 < g_1)
+    ]
+    has_swapped = True
+    while has_swapped:
+        has_swapped = False
+        for g_1, g_2 in pairs:
+            group_1, group_2 = state.groups[g_1], state.groups[g_2]
+            deltas = state.swap_deltas(g_1, g_2)
+            # how many students of the earlier split a swap would move for the first time
+            new_1 = ~(is_new[group_1] | moved[group_1])
+            new_2 = ~(is_new[group_2] | moved[group_2])
+            cost = new_1[:, None].astype(np.intp) + new_2[None, :]
+            # (small margin, as in maybe_swap)
+            improving = np.flatnonzero((deltas > 1e-9) & (cost <= max_moves - n_moved))
+            if len(improving) == 0:
+                continue
+            i, j = divmod(improving[0], deltas.shape[1])
+            n_moved += cost[i, j]
+            moved[[group_1[i], group_2[j]]] = True
+            state.swap(g_1, i, g_2, j)
+            has_swapped = True
+    return state.groups, int(is_new.sum()), len(left), n_moved
+
+
 def progressbar(it, prefix="", size=60, out=sys.stdout):
     """
     Progress bar for nicer UI, taken from https://stackoverflow.com/a/34482761
@@ -291,10 +2112,78 @@ def progressbar(it, prefix="", size=60, out=sys.stdout):
         )
 
     show(0.1)  # avoid div/0
-    for i, item in enumerate(it):
-        yield item
-        show(i + 1)
-    print("\n", flush=True, file=out)
+    try:
+        for i, item in enumerate(it):
+            yield item
+            show(i + 1)
+    finally:
+        # also end the line if the loop was left early
+        print("\n", flush=True, file=out)
+
+
+def write_groups(
+    df,
+    config,
+    students,
+    best_group_split,
+    output_dir,
+    o_prefix,
+    output_format,
+    n_workers,
+    state_file,
+):
+    """
+    Helper function to write the output files of a group split:
+    one file per group, the file with all groups and the group state file
+    for assignRest.py (if state_file is not None)
+    """
+    # save also per group (one folder per group)
+    # folder (should contain all info)
+    # attach the buddy group to every row of the original data
+    # (the groups hold the row positions of their students)
+    assignment = groups_to_assignment(best_group_split, len(df))
+    labels = np.array([f"{o_prefix}{i+1}" for i in range(len(best_group_split))])
+    # drop the original index
+    df = df.drop("Unnamed: 0", axis=1, errors="ignore")
+    df["Buddy Group"] = labels[assignment]
+
+    # all students sorted by group (in the original order inside of a group)
+    all_data = df.iloc[np.argsort(assignment, kind="stable")].reset_index(drop=True)
+
+    # the group files are independent, so they are written in parallel
+    paths, frames = [], []
+    for label, groupdf in all_data.groupby("Buddy Group", sort=False):
+        dir_path = os.path.join(output_dir, label)
+        if not os.path.isdir(dir_path):
+            os.makedirs(dir_path)
+        paths.append(os.path.join(dir_path, f"{label}.xlsx"))
+        frames.append(groupdf.drop(columns="Buddy Group").reset_index(drop=True))
+    with ProcessPoolExecutor(max_workers=n_workers) as ex:
+        list(ex.map(write_table, frames, paths, itertools.repeat(output_format)))
+
+    # write the result
+    out_path = os.path.join(output_dir, f"{o_prefix}_all_groups.xlsx")
+    all_columns = [
+        "Buddy Group",
+        config["fname_col"],
+        config["lname_col"],
+        config["sn_col"],
+    ] + [config[a] for a in ATTRIBUTES]
+    write_table(all_data[all_columns], out_path, output_format)
+
+    # save the composition of the groups for assignRest.py
+    if state_file is not None:
+        state = build_state(
+            labels,
+            assignment,
+            students.codes,
+            students.categories,
+            students.weights,
+            list(ATTRIBUTES),
+            [config[a] for a in ATTRIBUTES],
+            df[config["sn_col"]],
+        )
+        save_state(os.path.join(output_dir, state_file), state)
 
 
 def main(
@@ -305,10 +2194,45 @@ def main(
     dp_quit: bool,
     config: dict,
     runtime: int,
+    greedy_runs: int = GREEDY_RUNS,
+    search_mode: str = SEARCH_MODE,
+    n_workers: int = N_WORKERS,
+    seed: int = SEED,
+    init_mode: str = INIT_MODE,
+    bound_tolerance: float = BOUND_TOLERANCE,
+    target_score: float = TARGET_SCORE,
+    max_evals: int = MAX_EVALS,
+    patience_evals: int = PATIENCE_EVALS,
+    patience_time: float = PATIENCE_TIME,
+    greedy_patience: int = GREEDY_PATIENCE,
+    telemetry_file: str = TELEMETRY_FILE,
+    use_cache: bool = USE_CACHE,
+    output_format: str = OUTPUT_FORMAT,
+    sample_batch: int = SAMPLE_BATCH,
+    greedy_top_k: int = GREEDY_TOP_K,
+    state_file: str = STATE_FILE,
+    checkpoint_file: str = CHECKPOINT_FILE,
+    checkpoint_interval: float = CHECKPOINT_INTERVAL,
+    resume: bool = RESUME,
+    repair: bool = REPAIR,
+    repair_max_moves: int = REPAIR_MAX_MOVES,
+    adapt_budget: bool = ADAPT_BUDGET,
+    adapt_window: float = ADAPT_WINDOW,
+    adapt_ratio: float = ADAPT_RATIO,
 ):
     """
     The main function
+    Returns the diversity score of the saved group split
     """
+    # validate the stop conditions
+    if runtime is None and max_evals is None:
+        if search_mode == "anneal":
+            raise ValueError("The anneal search needs a RUNTIME or MAX_EVALS")
+        if target_score is None and patience_evals is None and patience_time is None:
+            raise ValueError("No stop condition for the search is set")
+    if (resume or repair) and checkpoint_file is None:
+        raise ValueError("RESUME and REPAIR need a CHECKPOINT_FILE")
+
     # validate filepaths and output dir
     if not os.path.isfile(input_file):
         raise FileNotFoundError(f"Provided path is: '{FILE}'")
@@ -316,8 +2240,12 @@ def main(
     if not os.path.isdir(output_dir):
         os.makedirs(output_dir)
 
+    telemetry = Telemetry()
+
     # read data
-    df = pd.read_excel(input_file, header=0)
+    with telemetry.phase("reading the input file"):
+        # (with the missing values filled in, to be consistent)
+        df = read_roster(input_file, use_cache, fill_na="N/A")
 
     # validate N_GROUPS < amount of students
     if n_groups > df.shape[0]:
@@ -325,9 +2253,6 @@ def main(
             f"Group amount ({n_groups}) is larger student amount ({df.shape[0]})"
         )
 
-    # fill NA values to be consistent
-    df = df.fillna("N/A")
-
     # flag potential duplicates
     # checking for:
     # 1. exact duplicates
@@ -340,97 +2265,297 @@ def main(
     # print some stats
     print("#" * 20)
     print("STATS:")
-    print_stats("gender", df, config, n_groups)
-    print_stats("country", df, config, n_groups)
-    print_stats("studyline", df, config, n_groups)
+    for attribute in ATTRIBUTES:
+        print_stats(attribute, df, config, n_groups)
     print("#" * 20)
 
-    # convert each row to a student and save all in a list
-    students = [
-        Student(i, study, gender, nat)
-        for i, (study, gender, nat) in enumerate(
-            zip(df[config["studyline"]], df[config["gender"]], df[config["country"]])
+    # convert the relevant columns into the compact (integer coded) representation
+    # this is only done once, everything afterwards works on the category codes
+    # (and saved in the cache of the input file for reruns)
+    def encode():
+        s = Students.from_df(df, config, ATTRIBUTES)
+        return s.codes, s.categories
+
+    columns = tuple(config[a] for a in ATTRIBUTES)
+    codes, categories = cached_codes(input_file, columns, encode, use_cache)
+    students = Students(codes, categories, list(ATTRIBUTES.values()))
+
+    if init_mode == "stratified":
+        create_groups = create_stratified_group
+    elif init_mode == "random":
+        create_groups = create_rand_group
+    else:
+        raise ValueError(f"Unknown init mode: '{init_mode}'")
+
+    # the best score that is possible in theory
+    # the search stops early once the best score is close enough to it
+    bound = score_bound(students, n_groups)
+    target = bound - bound_tolerance
+    if target_score is not None:
+        target = min(target, target_score)
+    print(f"Best possible diversity score (in theory): {bound}")
+
+    # one master seed sequence for the whole run
+    # the workers and the greedy phase each spawn their own independent stream from it
+    seed_seq = np.random.SeedSequence(seed)
+    print(f"Seed of this run: {seed_seq.entropy} (set SEED to this to repeat the run)")
+
+    # save the best group split regularly (and continue from an earlier one)
+    start = None
+    checkpoint = None
+    if checkpoint_file is not None:
+        checkpoint_path = os.path.join(output_dir, checkpoint_file)
+        keys = df[config["sn_col"]].astype(str).tolist()
+        metadata = {
+            "input_file": os.path.basename(input_file),
+            "n_groups": n_groups,
+            "attributes": ATTRIBUTES,
+            "seed": seed_seq.entropy,
+            "search_mode": search_mode,
+            "init_mode": init_mode,
+            "runtime": runtime,
+        }
+        prior_s = 0.0
+        start_score = None
+        if resume:
+            loaded = load_checkpoint(checkpoint_path, keys, n_groups)
+            if loaded is not None:
+                start, data = loaded
+                prior_s = data["metadata"].get("total_runtime_s", 0.0)
+                start_score = np.mean(partition_scores(start, students, n_groups))
+                print(
+                    f"Continuing from the checkpoint of {data['metadata'].get('saved_at')} "
+                    f"(diversity score {start_score})"
+                )
+        # (a checkpoint that the run does not continue from is not overwritten as is)
+        checkpoint = Checkpoint(
+            checkpoint_path, keys, checkpoint_interval, metadata, prior_s, protect=start is None
         )
-    ]
+        if start is not None:
+            checkpoint.update(start_score, start)
+
+    # the group state file of an earlier run (also updated by assignRest.py)
+    labels = [f"{o_prefix}{i + 1}" for i in range(n_groups)]
+    state_path = None if state_file is None else os.path.join(output_dir, state_file)
+    if not repair:
+        missing = set(placed_students(state_path, labels)) - set(df[config["sn_col"]].astype(str))
+        if missing:
+            print(f"WARNING: {len(missing)} students of '{state_path}' are not in the input file")
+            print("(e.g. placed by assignRest.py), they are not in the new groups")
+            print("Add them to the input file, or use REPAIR to keep the groups of all students")
 
-    # do random group assignments for a specified amount of time
+    if repair:
+        # only repair the group split of the checkpoint instead of searching a new one
+        data = read_checkpoint(checkpoint_path)
+        if data is None:
+            raise FileNotFoundError("REPAIR needs the checkpoint of an earlier run")
+        if data["metadata"].get("n_groups") != n_groups:
+            raise ValueError("The checkpoint to repair has another amount of groups")
+        # the students that assignRest.py placed since then keep their group
+        # (they are part of the earlier group split, not new students)
+        old = dict(zip(data["students"], data["groups"]))
+        n_placed = 0
+        for k, g in placed_students(state_path, labels).items():
+            if k not in old:
+                old[k] = g
+                n_placed += 1
+        if n_placed:
+            print(f"{n_placed} students placed by assignRest.py keep their group")
+        with telemetry.phase("repair"):
+            best_group_split, n_new, n_left, n_moved = repair_groups(
+                students, keys, list(old), list(old.values()), n_groups, repair_max_moves
+            )
+        best_score = np.mean(score_groups(best_group_split, students))
+        print("#" * 20)
+        print(f"Repaired the group split of {data['metadata'].get('saved_at')}:")
+        print(f"{n_left} students left, {n_new} students were added")
+        print(f"{n_moved} of the other students were moved to another group")
+        print(f"==> Diversity score is now: {best_score} (the closer to 0 the better)")
+        print(f"(Gap to the best possible score: {bound - best_score:.3g})")
+        print("#" * 20)
+        checkpoint.prior_s = data["metadata"].get("total_runtime_s", 0.0)
+        checkpoint.update(best_score, groups_to_assignment(best_group_split, len(df)))
+        checkpoint.save()
+        with telemetry.phase("writing the output files"):
+            write_groups(
+                df,
+                config,
+                students,
+                best_group_split,
+                output_dir,
+                o_prefix,
+                output_format,
+                n_workers,
+                state_file,
+            )
+        print("Statistics of the run:")
+        telemetry.summary()
+        if telemetry_file is not None:
+            telemetry.export(telemetry_file)
+            print(f"Statistics saved in '{telemetry_file}'")
+        return best_score
+
+    # do random group assignments until one of the stop conditions is met
+    # (by default: for a specified amount of time)
     # while tracking the group w the best diversity score
     # set the end time
-    t_end = time.time() + 60 * runtime
+    t_start = time.time()
+    t_end = None if runtime is None else t_start + 60 * runtime
+    stop = StopCriteria(t_end, target, max_evals, patience_evals, patience_time)
+    # hand the rest of the time over to the greedy search once the search falls behind it
+    monitor = None
+    if adapt_budget and runtime is not None and search_mode != "anneal":
+        rng = np.random.default_rng(seed_seq.spawn(1)[0])
+        rate = greedy_rate(students, n_groups, create_groups, rng)
+        monitor = BudgetMonitor(rate, adapt_window * 60 * runtime, adapt_ratio)
 
-    best_score = -10000000
-    best_group_split = None
-    amount_execs = 0
+    if runtime is None:
+        print("Starting the search (running until a stop condition is met)...")
+    else:
+        print(f"Starting the search (running at most {runtime} min)...")
+    # the best split of every search worker (start points of the greedy phase)
+    elites = []
+    with telemetry.phase("search"):
+        if search_mode == "pool":
+            best_score, best_group_split, amount_execs, n_dupl = pool_search(
+                students,
+                n_groups,
+                stop,
+                n_workers,
+                seed_seq,
+                create_groups=create_groups,
+                telemetry=telemetry,
+                batch_size=sample_batch,
+                elites=elites,
+                start=start,
+                checkpoint=checkpoint,
+                monitor=monitor,
+            )
+        elif search_mode == "anneal":
+            best_score, best_group_split, amount_execs, n_dupl = pool_search(
+                students,
+                n_groups,
+                stop,
+                n_workers,
+                seed_seq,
+                worker=anneal_worker,
+                create_groups=create_groups,
+                telemetry=telemetry,
+                elites=elites,
+                start=start,
+                checkpoint=checkpoint,
+            )
+        elif search_mode == "island":
+            best_score, best_group_split, amount_execs, n_dupl = pool_search(
+                students,
+                n_groups,
+                stop,
+                n_workers,
+                seed_seq,
+                worker=island_worker,
+                create_groups=create_groups,
+                telemetry=telemetry,
+                elites=elites,
+                islands=True,
+                start=start,
+                checkpoint=checkpoint,
+                monitor=monitor,
+            )
+        elif search_mode == "batch":
+            best_score, best_group_split, amount_execs, n_dupl = batch_search(
+                students,
+                n_groups,
+                stop,
+                seed_seq,
+                create_groups,
+                telemetry,
+                start=start,
+                checkpoint=checkpoint,
+                monitor=monitor,
+            )
+        else:
+            raise ValueError(f"Unknown search mode: '{search_mode}'")
+    rate = amount_execs / (time.time() - t_start)
+    if monitor is not None and monitor.reason is not None:
+        print(f"Stopping the search early ({monitor.reason})")
+        telemetry.count("search handed over to the greedy search", 1)
 
-    print(f"Starting the search (running {runtime} min)...")
-    while time.time() < t_end:
-        # For the specified amount of time create random groups in
-        # batches of 50 processes at a time and then evaluate
-        # the number 50 is chosen arbitrarily but shouldnt be too high
-        # to avoid performance issues (especially on slower devices)
-        with ProcessPoolExecutor() as ex:
-            processes = [ex.submit(mp_wrapper, students, n_groups) for i in range(50)]
-        # track the amount of executions for more insights
-        amount_execs += 50
-
-        for p in processes:
-            result = p.result()
-            # check if the result was better than the best score
-            # if so then save the score and the group split
-            if result[0] > best_score:
-                best_score = result[0]
-                best_group_split = result[1]
-
-    tried = round(amount_execs / stirling_second_kind(df.shape[0], n_groups), 10)
-    print(f"Finished. Tried {amount_execs} combinations")
-    print(f"(This is equal to around {tried}% of all possible combinations)")
+    if search_mode == "anneal":
+        print(f"Finished. Tried {amount_execs} swaps of students ({rate:.0f} per second)")
+    elif search_mode == "island":
+        print(f"Finished. Checked {amount_execs} pairs of groups ({rate:.0f} per second)")
+    else:
+        # (only the random search tries whole group splits)
+        tried = round(amount_execs / stirling_second_kind(df.shape[0], n_groups), 10)
+        print(f"Finished. Tried {amount_execs} combinations ({rate:.0f} per second)")
+        if n_dupl is not None:
+            print(f"({n_dupl} of them were duplicates, {amount_execs - n_dupl} were distinct)")
+        print(f"(This is equal to around {tried}% of all possible combinations)")
     print("#" * 20)
     print(f"==> Best diversity score is: {best_score} (the closer to 0 the better)")
+    print(f"(Gap to the best possible score: {bound - best_score:.3g})")
     print("#" * 20)
     print("Running greedy swapping search to try to improve")
     # now take the group w the best diversity score and apply greedy algorithm
     # to try to swap around students until the diversity score
-    # try 100 different swaps
-    groups = best_group_split
-    for _ in progressbar(range(100)):
-        groups = greedy_assign(groups)
-        score = np.mean([diversity_score(g) for g in groups])
-        if score > best_score:
-            best_group_split = groups
-            best_score = score
-    print("Finished")
+    # try greedy_runs different swaps (independent restarts on all workers)
+    # (stop early once the target is reached or the restarts stop improving)
+    greedy_stop = StopCriteria(target=target, patience_evals=greedy_patience)
+    greedy_stop.update(best_score, 0)
+    # if the search stopped early, the time that is left is given to the greedy search
+    t_greedy = time.perf_counter()
+    starts = (elites or [best_group_split])[:greedy_top_k]
+    best_score, best_group_split = greedy_search(
+        students,
+        starts,
+        n_groups,
+        greedy_stop,
+        greedy_runs,
+        t_end,
+        n_workers,
+        seed_seq,
+        telemetry,
+        checkpoint,
+    )
+    telemetry.add_time("greedy", time.perf_counter() - t_greedy)
+    telemetry.count("greedy restarts", greedy_stop.n_evals)
+    print(f"Finished after {greedy_stop.n_evals} restarts")
     print("#" * 20)
     print(f"==> Best diversity score is now: {best_score} (the closer to 0 the better)")
+    print(f"(Gap to the best possible score: {bound - best_score:.3g})")
+    if bound_reached(best_score, bound):
+        print("This is the best possible score, no other group split is more diverse")
     print("#" * 20)
+    if checkpoint is not None:
+        checkpoint.update(best_score, groups_to_assignment(best_group_split, len(df)))
+        if checkpoint.save():
+            print(f"Best group split saved in '{checkpoint.path}' (continue from it with RESUME)")
     # the overview
     # pd.DataFrame(
     #     best_group_split, index=[f"{o_prefix}{i}" for i in range(1, n_groups + 1)]
     # ).to_excel(out_path)
 
-    # save also per group (one folder per group)
-    # folder (should contain all info)
-    all_data = pd.DataFrame(columns=["Buddy Group", config["fname_col"], config["lname_col"], config["sn_col"]])
-    for i, g in enumerate(best_group_split):
-        dir_path = os.path.join(output_dir, f"{o_prefix}{i+1}")
-        if not os.path.isdir(dir_path):
-            os.makedirs(dir_path)
-        values = []
-        for student in g:
-            values.append(student.get_orig_data(df).values)
-        groupdf = pd.DataFrame(values, columns=df.columns)
-        # drop the original index
-        groupdf = groupdf.drop("Unnamed: 0", axis=1, errors="ignore")
-        groupdf.reset_index(drop=True, inplace=True)
-        out_path = os.path.join(dir_path, f"{o_prefix}{i+1}.xlsx")
-        groupdf.to_excel(out_path)
-        # add to the overall dataframe
-        groupdf["Buddy Group"] = f"{o_prefix}{i+1}"
-        all_data = pd.concat([all_data, groupdf[["Buddy Group", config["fname_col"], config["lname_col"], config["sn_col"], config["gender"], config["studyline"], config["country"]]]])
-        all_data.reset_index(drop=True, inplace=True)
-    
-# write the result
-    out_path = os.path.join(output_dir, f"{o_prefix}_all_groups.xlsx")
-    all_data.to_excel(out_path)
+    t_output = time.perf_counter()
+    write_groups(
+        df,
+        config,
+        students,
+        best_group_split,
+        output_dir,
+        o_prefix,
+        output_format,
+        n_workers,
+        state_file,
+    )
+    telemetry.add_time("writing the output files", time.perf_counter() - t_output)
+
+    print("#" * 20)
+    print("Statistics of the run:")
+    telemetry.summary()
+    if telemetry_file is not None:
+        telemetry.export(telemetry_file)
+        print(f"Statistics saved in '{telemetry_file}'")
+    return best_score
 
 
 if __name__ == "__main__":
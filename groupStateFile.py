@@ -0,0 +1,148 @@
+"""
+Helper module for the group state file
+
+createGroups.py saves the composition of the final groups in this file:
+the size of every group and how often every category of every attribute
+(e.g. every country) occurs in it. assignRest.py loads it to place students
+that sign up late into the group where they share the fewest traits, without
+running the whole search again, and saves it again with these students added
+so that later runs know about them too
+
+The file also holds the group of every placed student (by student number),
+so a student that is already in it is not placed (and counted) a second time
+when assignRest.py is run again on the same file
+"""
+
+import json
+import os
+
+import numpy as np
+
+# increase this if the content of the state file changes, so old files are not used
+STATE_VERSION = 2
+
+
+def build_state(
+    labels, assignment, codes, categories, weights, attributes, columns, student_numbers
+):
+    """
+    Helper function to build the state of a group split
+    - labels: the name of every group (e.g. "M1")
+    - assignment: the group id of every student
+    - codes, categories, weights: the category codes of the students, the
+      categories and the weight of every attribute (as in createGroups.Students)
+    - attributes, columns: the name and the column name of every attribute
+    - student_numbers: the student number of every student
+    """
+    n_groups = len(labels)
+    state = {
+        "labels": [str(label) for label in labels],
+        "sizes": np.bincount(assignment, minlength=n_groups),
+        "attributes": [],
+        "students": {str(s): int(g) for s, g in zip(student_numbers, assignment)},
+    }
+    for name, column, attr_codes, attr_categories, weight in zip(
+        attributes, columns, codes, categories, weights
+    ):
+        counts = np.zeros((n_groups, len(attr_categories)), dtype=np.int64)
+        np.add.at(counts, (assignment, attr_codes), 1)
+        state["attributes"].append(
+            {
+                "name": name,
+                "column": column,
+                "weight": float(weight),
+                "categories": [str(c) for c in attr_categories],
+                "counts": counts,
+            }
+        )
+    index_categories(state)
+    return state
+
+
+def index_categories(state):
+    """
+    Helper function to add the lookup from a category to its column in the counts
+    """
+    for attribute in state["attributes"]:
+        attribute["index"] = {c: i for i, c in enumerate(attribute["categories"])}
+
+
+def save_state(path, state):
+    """
+    Helper function to save the state of a group split as a json file
+    (written to a temporary file first, so a cancelled run cannot leave a broken file)
+    """
+    data = {
+        "version": STATE_VERSION,
+        "labels": state["labels"],
+        "sizes": state["sizes"].tolist(),
+        "attributes": [
+            {
+                "name": a["name"],
+                "column": a["column"],
+                "weight": a["weight"],
+                "categories": a["categories"],
+                "counts": a["counts"].tolist(),
+            }
+            for a in state["attributes"]
+        ],
+        "students": state["students"],
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def load_state(path):
+    """
+    Helper function to load the state of a group split
+    """
+    with open(path) as f:
+        state = json.load(f)
+    if state.pop("version", None) != STATE_VERSION:
+        raise ValueError(f"The group state file '{path}' was written by another version")
+    state["sizes"] = np.array(state["sizes"], dtype=np.int64)
+    for attribute in state["attributes"]:
+        counts = np.array(attribute["counts"], dtype=np.int64)
+        attribute["counts"] = counts.reshape(len(state["labels"]), -1)
+    index_categories(state)
+    return state
+
+
+def place_student(state, student_number, values):
+    """
+    Place one student into the group where the diversity score gets the least worse,
+    i.e. where the student shares the fewest (weighted) traits with the others
+    Ties are broken by the group size (then by the group order)
+    values are the values of the student for the attributes of the state
+    The counts and sizes of the state are updated and the student is recorded
+    (a student that is already in the state keeps its group and changes nothing)
+    Returns the index of the chosen group
+    """
+    student_number = str(student_number)
+    if student_number in state["students"]:
+        return state["students"][student_number]
+    increase = np.zeros(len(state["labels"]))
+    codes = []
+    for attribute, value in zip(state["attributes"], values):
+        value = str(value)
+        code = attribute["index"].get(value)
+        if code is None:
+            # a category that nobody in the groups has yet
+            code = len(attribute["categories"])
+            attribute["categories"].append(value)
+            attribute["index"][value] = code
+            counts = attribute["counts"]
+            attribute["counts"] = np.hstack([counts, np.zeros((len(counts), 1), counts.dtype)])
+        # every student of the group with the same category is one more shared pair
+        increase += attribute["weight"] * attribute["counts"][:, code]
+        codes.append(code)
+    # (small margin, so that rounding errors of the weights do not decide ties)
+    candidates = np.flatnonzero(increase <= increase.min() + 1e-9)
+    group = candidates[np.argmin(state["sizes"][candidates])]
+    for attribute, code in zip(state["attributes"], codes):
+        attribute["counts"][group, code] += 1
+    state["sizes"][group] += 1
+    state["students"][student_number] = int(group)
+    return int(group)
@@ -0,0 +1,81 @@
+"""
+Helper module that writes the result tables of the scripts
+(createGroups.py, assignRest.py, tickets/createTicketTokens.py)
+
+Supported output formats:
+- "xlsx": excel file written with pandas' default writer (old behavior)
+- "xlsx-stream": excel file written row by row with openpyxl's write-only mode,
+  which is faster and does not build the whole workbook in memory
+- "csv": csv file (fastest, e.g. for mail merge)
+- "parquet": parquet file (needs the package pyarrow)
+"""
+
+import os
+
+import openpyxl
+import pandas as pd
+
+# file extension of every output format
+EXTENSIONS = {
+    "xlsx": ".xlsx",
+    "xlsx-stream": ".xlsx",
+    "csv": ".csv",
+    "parquet": ".parquet",
+}
+
+
+def output_path(path, output_format):
+    """
+    Helper function to get the path with the file extension of the output format
+    """
+    if output_format not in EXTENSIONS:
+        raise ValueError(f"Unknown output format: '{output_format}'")
+    return os.path.splitext(path)[0] + EXTENSIONS[output_format]
+
+
+def write_xlsx_stream(df, path):
+    """
+    Helper function to write a dataframe (with its index, like to_excel)
+    to an excel file with openpyxl's write-only mode
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    ws.append([None] + [str(c) for c in df.columns])
+    # openpyxl cannot write the missing values of pandas, so write empty cells
+    values = df.astype(object).where(df.notna(), None)
+    for row in values.itertuples(name=None):
+        ws.append(row)
+    wb.save(path)
+
+
+def parquet_safe(df):
+    """
+    Helper function to get a copy of a dataframe that pyarrow can write:
+    a column with mixed values (e.g. numbers and "N/A" after fillna) cannot be
+    written, so all object columns are written as text (missing values stay missing)
+    """
+    columns = df.columns[df.dtypes == object]
+    return df.astype({c: "string" for c in columns})
+
+
+def write_table(df, path, output_format="xlsx"):
+    """
+    Write a dataframe in the given output format
+    The file extension of path is replaced with the one of the format
+    Returns the path of the written file
+    """
+    path = output_path(path, output_format)
+    if output_format == "xlsx":
+        df.to_excel(path)
+    elif output_format == "xlsx-stream":
+        write_xlsx_stream(df, path)
+    elif output_format == "csv":
+        df.to_csv(path)
+    elif output_format == "parquet":
+        try:
+            parquet_safe(df).to_parquet(path)
+        except ImportError as exc:
+            print("ERROR: Please install the package pyarrow to write parquet files")
+            print("Most likely this is done with 'pip install pyarrow'")
+            raise exc
+    return path
@@ -0,0 +1,241 @@
+"""
+Helper module that caches the parsed student file (the registration workbook)
+
+Parsing an excel file with openpyxl is slow for large sheets, and the scripts
+(createGroups.py, assignRest.py, tickets/createTicketTokens.py) are often rerun
+on the same file while tuning parameters. Therefore the parsed sheet (and the
+NA-filled sheet and the encoded categories of createGroups.py) are saved in fast
+binary files the first time, and loaded from there on every rerun:
+- key.json: the key of the input file and the list of saved entries
+- the frames as parquet files (needs the package pyarrow, otherwise nothing is cached)
+- the encoded categories as npz files
+None of these formats can hold code, so a changed cache cannot run anything
+
+The cache is saved in the directory '.roster_cache' next to the input file
+(it holds the same student data as the input file, so treat it the same way!)
+It is only used while the content (hash) and the modification time of the input file
+(and the pandas version) are unchanged, otherwise the file is parsed again and
+the cache is overwritten. A cache that cannot be loaded is treated the same way
+
+Only key.json is read to check the key, and the checked key is kept for the rest
+of the run, so the input file is only hashed once per run
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from outputWriter import parquet_safe
+
+# name of the directory (next to the input file) that holds the cache files
+CACHE_DIR = ".roster_cache"
+
+# increase this if the content of the cache files changes, so old caches are not used
+CACHE_VERSION = 3
+
+# the cache checked (or saved) last in this run for every input file, together with
+# the modification time and size of the input file at that time
+_LOADED = {}
+
+
+def cache_path(path):
+    """
+    Helper function to get the path of the cache directory of an input file
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, CACHE_DIR, name)
+
+
+def file_stat(path):
+    """
+    Helper function to get the modification time and size of a file
+    """
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def file_key(path):
+    """
+    Helper function to get the key that identifies the current state of a file
+    (hash of the content and modification time, and the pandas version,
+    as a frame saved by another version may not load the same way)
+    """
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return [CACHE_VERSION, pd.__version__, sha.hexdigest(), os.stat(path).st_mtime_ns]
+
+
+def write_file(path, write):
+    """
+    Helper function to write a cache file with write(file path)
+    (written to a temporary file first, so a cancelled run cannot leave a broken file)
+    """
+    tmp_path = f"{path}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_cache(path):
+    """
+    Helper function to get the cache of an input file: its key and the names
+    of the saved entries with their file names
+    Returns None if there is no cache, if it is outdated or if it cannot be read
+    """
+    loaded = _LOADED.get(os.path.abspath(path))
+    try:
+        stat = file_stat(path)
+        if loaded is not None and loaded[0] == stat:
+            return loaded[1]
+        with open(os.path.join(cache_path(path), "key.json")) as f:
+            cache = json.load(f)
+        if cache["key"] != file_key(path) or not isinstance(cache["entries"], dict):
+            return None
+    except Exception:
+        # any broken cache is the same as no cache, the file is parsed again
+        return None
+    _LOADED[os.path.abspath(path)] = (stat, cache)
+    return cache
+
+
+def save_cache(path, cache):
+    """
+    Helper function to save the key and the list of entries of the cache of an input file
+    """
+
+    def write(p):
+        with open(p, "w") as f:
+            json.dump(cache, f)
+
+    write_file(os.path.join(cache_path(path), "key.json"), write)
+    # (unless the input file was changed since its key was taken)
+    stat = file_stat(path)
+    if stat[0] == cache["key"][-1]:
+        _LOADED[os.path.abspath(path)] = (stat, cache)
+
+
+def new_cache(path):
+    """
+    Helper function to start a new (empty) cache for an input file,
+    the files of an outdated cache are removed
+    Returns None if the cache cannot be written (then nothing is cached)
+    """
+    directory = cache_path(path)
+    try:
+        shutil.rmtree(directory, ignore_errors=True)
+        # (the pickle file of older versions of this module)
+        if os.path.isfile(f"{directory}.pkl"):
+            os.remove(f"{directory}.pkl")
+        os.makedirs(directory)
+        cache = {"key": file_key(path), "entries": {}}
+        save_cache(path, cache)
+    except OSError:
+        return None
+    return cache
+
+
+def add_entry(path, cache, name, extension, write):
+    """
+    Helper function to save an entry of the cache with write(file path)
+    A cache that cannot be written is simply not used
+    """
+    if cache is None:
+        return
+    # (the same entry always gets the same file)
+    file_name = hashlib.sha256(name.encode("utf-8")).hexdigest()[:16] + extension
+    try:
+        write_file(os.path.join(cache_path(path), file_name), write)
+    except ImportError:
+        print("NOTE: Install the package pyarrow to cache the parsed input file")
+        return
+    except Exception:
+        return
+    cache["entries"][name] = file_name
+    save_cache(path, cache)
+
+
+def load_entry(path, cache, name, read):
+    """
+    Helper function to load an entry of the cache with read(file path)
+    Returns None if the entry is not saved or cannot be loaded
+    """
+    if cache is None or name not in cache["entries"]:
+        return None
+    try:
+        return read(os.path.join(cache_path(path), cache["entries"][name]))
+    except Exception:
+        return None
+
+
+def read_roster(path, use_cache=True, fill_na=None):
+    """
+    Read the student file (same as pd.read_excel(path, header=0))
+    with the missing values replaced by fill_na (None = not replaced)
+    The parsed sheet is taken from the cache if the file has not changed
+    (the columns that hold text or mixed values are then read as text)
+    """
+    if not use_cache:
+        df = pd.read_excel(path, header=0)
+        return df if fill_na is None else df.fillna(fill_na)
+    cache = load_cache(path)
+    name = "roster" if fill_na is None else f"roster filled with {fill_na!r}"
+    df = load_entry(path, cache, name, pd.read_parquet)
+    if df is not None:
+        return df
+    if cache is None:
+        cache = new_cache(path)
+    df = pd.read_excel(path, header=0)
+    if fill_na is not None:
+        df = df.fillna(fill_na)
+    # (the same frame as the one that is loaded from the cache in the next runs)
+    df = parquet_safe(df)
+    add_entry(path, cache, name, ".parquet", df.to_parquet)
+    return df
+
+
+def cached_codes(path, columns, encode, use_cache=True):
+    """
+    Get the encoded categories of the columns of the student file: the category
+    code of every student for every column and the categories of every column
+    They are made with encode() once (which returns the codes and the categories)
+    and then saved in the cache of the file, until the file changes
+    The categories are returned as text
+    """
+    if not use_cache:
+        codes, categories = encode()
+        return codes, [[str(c) for c in cats] for cats in categories]
+    cache = load_cache(path)
+    name = f"codes of {list(columns)!r}"
+
+    def read(p):
+        with np.load(p, allow_pickle=False) as data:
+            flat = data["categories"].tolist()
+            bounds = np.cumsum(data["lengths"]).tolist()
+            categories = [flat[a:b] for a, b in zip([0] + bounds[:-1], bounds)]
+            return data["codes"], categories
+
+    loaded = load_entry(path, cache, name, read)
+    if loaded is not None:
+        return loaded
+    if cache is None:
+        cache = new_cache(path)
+    codes, categories = encode()
+    categories = [[str(c) for c in cats] for cats in categories]
+
+    def write(p):
+        # (np.savez adds ".npz" to names without it, so the file is written directly)
+        with open(p, "wb") as f:
+            np.savez(
+                f,
+                codes=codes,
+                categories=np.array([c for cats in categories for c in cats], dtype=str),
+                lengths=np.array([len(cats) for cats in categories]),
+            )
+
+    add_entry(path, cache, name, ".npz", write)
+    return codes, categories
@@ -0,0 +1,237 @@
+"""
+Benchmark suite for the group assigner
+
+Times the building blocks of createGroups (scoring, creating group splits,
+swapping) and a full run of createGroups.main with a fixed time budget
+on synthetic cohorts of different sizes and group counts
+
+The results (calls per second, samples per second, swaps per second
+and the reached scores) are written to a JSON file, so that the numbers
+of different commits can be compared
+
+Run from the root of the repository with 'python testing/benchmark.py'
+"""
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import createGroups  # noqa: E402
+from createGroups import (  # noqa: E402
+    ATTRIBUTES,
+    CONFIG,
+    GroupState,
+    SAMPLE_BATCH,
+    Students,
+    batch_scores,
+    create_rand_batch,
+    create_rand_group,
+    create_stratified_group,
+    diversity_score,
+    greedy_assign,
+    maybe_swap,
+    mp_wrapper,
+    score_groups,
+)
+
+###########################################
+# ADJUST THESE PARAMETERS
+# (amount of students, amount of groups) of the benchmarked cohorts
+COHORTS = [(100, 10), (100, 24), (1000, 50), (1000, 200), (10000, 100), (10000, 500)]
+
+# How long every building block is timed (in seconds)
+MIN_TIME = 1.0
+
+# How long the search of the full createGroups.main run may take (in minutes)
+MAIN_RUNTIME = 0.05
+
+# How many greedy restarts the full createGroups.main run does
+MAIN_GREEDY_RUNS = 5
+
+# Only run the full createGroups.main for cohorts up to this size
+MAIN_MAX_STUDENTS = 1000
+
+# The file the results are written to
+OUTPUT_FILE = "bench_results.json"
+
+SEED = 0
+# END OF ADJUSTING
+###########################################
+
+
+def fake_roster(n_students, rng):
+    """
+    Helper function to create a synthetic roster with the columns of CONFIG
+    (same distributions as testing/generate_fake_data.py)
+    """
+    genders = ["male", "female", "non-binary"]
+    countries = [f"Country {i}" for i in range(20)]
+    country_probs = 1 / np.arange(1, 21)
+    studylines = [f"Study line {i}" for i in range(6)]
+    numbers = [f"s{i:06}" for i in range(n_students)]
+    return pd.DataFrame(
+        {
+            CONFIG["fname_col"]: numbers,
+            CONFIG["lname_col"]: numbers,
+            CONFIG["sn_col"]: numbers,
+            CONFIG["email_col"]: [f"{n}@example.com" for n in numbers],
+            CONFIG["gender"]: rng.choice(genders, n_students, p=[0.4, 0.3, 0.3]),
+            CONFIG["country"]: rng.choice(
+                countries, n_students, p=country_probs / country_probs.sum()
+            ),
+            CONFIG["studyline"]: rng.choice(studylines, n_students),
+        }
+    )
+
+
+def rate(fn):
+    """
+    Helper function to call fn repeatedly for at least MIN_TIME seconds
+    Returns the amount of calls per second
+    """
+    n_calls = 0
+    t_start = time.perf_counter()
+    while True:
+        fn()
+        n_calls += 1
+        elapsed = time.perf_counter() - t_start
+        if elapsed >= MIN_TIME:
+            return n_calls / elapsed
+
+
+def bench_swaps(groups, students, rng):
+    """
+    Helper function to time maybe_swap on random pairs of groups
+    Returns the amount of calls per second and the share of accepted swaps
+    """
+    state = GroupState([g.copy() for g in groups], students)
+    n_groups = len(groups)
+    accepted = []
+
+    def one_swap():
+        g_1, g_2 = rng.choice(n_groups, 2, replace=False)
+        accepted.append(maybe_swap(state, g_1, g_2))
+
+    return rate(one_swap), float(np.mean(accepted))
+
+
+def bench_main(df, n_groups):
+    """
+    Helper function to run createGroups.main on the roster with a fixed budget
+    Returns the used time and the final diversity score
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = os.path.join(tmp, "roster.xlsx")
+        df.to_excel(input_file)
+        t_start = time.perf_counter()
+        # the output of main is not needed here
+        with contextlib.redirect_stdout(io.StringIO()):
+            score = createGroups.main(
+                input_file,
+                os.path.join(tmp, "groups"),
+                "M",
+                n_groups,
+                True,
+                CONFIG,
+                MAIN_RUNTIME,
+                greedy_runs=MAIN_GREEDY_RUNS,
+                seed=SEED,
+            )
+        return time.perf_counter() - t_start, float(score)
+
+
+def bench_cohort(n_students, n_groups):
+    """
+    Helper function to run all benchmarks on one cohort
+    """
+    rng = np.random.default_rng(SEED)
+    df = fake_roster(n_students, rng)
+    students = Students.from_df(df, CONFIG, ATTRIBUTES)
+    groups = create_rand_group(students, n_groups, rng)
+    result = {"n_students": n_students, "n_groups": n_groups}
+
+    result["diversity_score_per_s"] = rate(lambda: diversity_score(groups[0], students))
+    result["score_groups_per_s"] = rate(lambda: score_groups(groups, students))
+    result["create_rand_group_per_s"] = rate(
+        lambda: create_rand_group(students, n_groups, rng)
+    )
+    result["create_stratified_group_per_s"] = rate(
+        lambda: create_stratified_group(students, n_groups, rng)
+    )
+    result["mp_wrapper_samples_per_s"] = rate(
+        lambda: mp_wrapper(students, n_groups, rng.integers(2**32))
+    )
+    batch_size = max(1, min(SAMPLE_BATCH, 2_000_000 // n_students))
+    result["batch_samples_per_s"] = batch_size * rate(
+        lambda: batch_scores(
+            create_rand_batch(students, n_groups, batch_size, rng)[0], students, n_groups
+        )
+    )
+    swaps_per_s, accepted = bench_swaps(groups, students, rng)
+    result["maybe_swap_per_s"] = swaps_per_s
+    result["maybe_swap_accepted"] = accepted
+
+    t_start = time.perf_counter()
+    refined = greedy_assign([g.copy() for g in groups], students, rng)
+    result["greedy_assign_s"] = time.perf_counter() - t_start
+    result["random_score"] = float(np.mean(score_groups(groups, students)))
+    result["greedy_score"] = float(np.mean(score_groups(refined, students)))
+
+    if n_students <= MAIN_MAX_STUDENTS:
+        result["main_s"], result["main_score"] = bench_main(df, n_groups)
+    return result
+
+
+def git_commit():
+    """
+    Helper function to get the commit the benchmark runs on (None if unknown)
+    """
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def main():
+    results = []
+    for n_students, n_groups in COHORTS:
+        print(f"Benchmarking {n_students} students in {n_groups} groups...")
+        result = bench_cohort(n_students, n_groups)
+        for key, value in result.items():
+            print(f"  {key}: {value:.4g}" if isinstance(value, float) else f"  {key}: {value}")
+        results.append(result)
+
+    report = {
+        "commit": git_commit(),
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "cpu_count": os.cpu_count(),
+        "min_time": MIN_TIME,
+        "main_runtime": MAIN_RUNTIME,
+        "results": results,
+    }
+    with open(OUTPUT_FILE, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to '{OUTPUT_FILE}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Script to compare the search modes of createGroups on the test data
+For every time budget it runs
+- the random search followed by the greedy swapping search ("pool" + greedy)
+- the simulated annealing search followed by the greedy swapping search ("anneal" + greedy)
+- the island search followed by the greedy swapping search ("island" + greedy)
+and prints the diversity score that was reached after the search phase
+and after both phases (and the time that was needed for it)
+
+Run from the root of the repository with 'python testing/compare_search_modes.py'
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from createGroups import (  # noqa: E402
+    ATTRIBUTES,
+    CONFIG,
+    GREEDY_RUNS,
+    StopCriteria,
+    Students,
+    anneal_worker,
+    greedy_assign,
+    island_worker,
+    pool_search,
+    score_groups,
+    search_worker,
+)
+
+FILE = os.path.join(os.path.dirname(__file__), "testdata.xlsx")
+N_GROUPS = 10
+BUDGETS = [1, 3, 10]  # seconds for the search phase
+REPEATS = 3
+
+
+def run(students, mode, budget, seed):
+    """
+    Helper function to run the search and the greedy phase once
+    Returns the score after the search, the final score and the used time
+    """
+    worker = {"pool": search_worker, "anneal": anneal_worker, "island": island_worker}[mode]
+    seed_seq = np.random.SeedSequence(seed)
+    rng = np.random.default_rng(seed_seq.spawn(1)[0])
+    t_start = time.time()
+    best_score, groups, _, _ = pool_search(
+        students,
+        N_GROUPS,
+        StopCriteria(t_start + budget),
+        None,
+        seed_seq,
+        worker=worker,
+        islands=mode == "island",
+    )
+    search_score = best_score
+    for _ in range(GREEDY_RUNS):
+        groups = greedy_assign(groups, students, rng)
+        best_score = max(best_score, np.mean(score_groups(groups, students)))
+    return search_score, best_score, time.time() - t_start
+
+
+def main():
+    df = pd.read_excel(FILE, header=0).fillna("N/A")
+    students = Students.from_df(df, CONFIG, ATTRIBUTES)
+    print(
+        "mode, search budget (s), mean score after search, "
+        "mean final score, mean total time (s)"
+    )
+    for budget in BUDGETS:
+        for mode in ["pool", "anneal", "island"]:
+            results = [run(students, mode, budget, seed) for seed in range(REPEATS)]
+            search_scores, scores, times = zip(*results)
+            print(
+                f"{mode}, {budget}, {np.mean(search_scores):.3f}, "
+                f"{np.mean(scores):.3f}, {np.mean(times):.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
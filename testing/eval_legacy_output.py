@@ -6,10 +6,11 @@ to the new method
 import pandas as pd
 import numpy as np
 from createGroups import diversity_score
-from createGroups import Student
+from createGroups import Students
 df = pd.read_excel("output1.xlsx")
 df = df.drop("Unnamed: 0", axis=1)
 
+rows = []
 groups = []
 for i in df.columns:
     g = []
@@ -17,7 +18,11 @@ for i in df.columns:
         if x is np.nan:
             continue
         infos = x.replace(" ", "").split(",")
-        g.append(Student(infos[0], infos[1], infos[2], infos[3]))
-    groups.append(g)
+        g.append(len(rows))
+        rows.append(infos[1:4])
+    groups.append(np.array(g))
 
-print(np.mean([diversity_score(g) for g in groups]))
+config = {"studyline": 0, "gender": 1, "country": 2}
+students = Students.from_df(pd.DataFrame(rows), config, list(config))
+
+print(np.mean([diversity_score(g, students) for g in groups]))
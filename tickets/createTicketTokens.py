@@ -11,6 +11,7 @@ Students are identified by student number
 For ease of use the output will also contain their first and last name
 """
 
+import base64
 import os
 import secrets
 import sys
@@ -27,6 +28,13 @@ except ImportError as exc:
     print("Most likely this is done with 'pip install pandas openpyxl numpy'")
     raise exc
 
+# the cache module is in the root of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from outputWriter import output_path, write_table  # noqa: E402
+from rosterCache import read_roster  # noqa: E402
+from tokenStore import TokenStore  # noqa: E402
+from verifyTokens import TOKEN_LEN, derive_token, load_secret  # noqa: E402
+
 ###########################################
 # ADJUST THESE PARAMETERS
 # INPUT FILE PATH (absolute or relative path!)
@@ -35,6 +43,17 @@ FILE = "testing/testdata.xlsx"
 # PATH TO THE FILE THAT WILL HOLD THE TOKEN INFO
 TOKEN_FILE = "tokens.xlsx"
 
+# Local database (SQLite) that keeps all issued tokens, so that a rerun with a newer
+# student file only issues tokens to the students that do not have one yet,
+# e.g. "tokens.sqlite" (treat it like the token files!)
+# (None = old behavior: all tokens are written to TOKEN_FILE, which must not exist yet)
+TOKEN_STORE = None
+
+# Which tokens of the token store are written to the token file (only used with TOKEN_STORE)
+# "new": only the tokens issued in this run (to TOKEN_FILE with "_batch<number>" added)
+# "all": all tokens in the store (TOKEN_FILE is overwritten)
+EXPORT = "new"
+
 # Config that tells the script how the columns are named
 # change this to match the excel file column names
 # e.g. "name_col" : "name" tells the script to find the name value
@@ -47,105 +66,196 @@ CONFIG = {
     "token_col": "Token",
 }
 
-# TOKEN LENGTH - only relevant to modify if you know what you are doing
-# basically the longer this is the longer and more secure the tokens will be
-# a setting of 16 bits might not be the most secure, but depending on the context
-# this is sufficient enough will ensuring the token is still not too long
-TOKEN_LEN = 16
+# Keep a parsed copy of the input file (in '.roster_cache' next to it)
+# so that reruns on the same file do not need to parse the excel file again
+USE_CACHE = True
+
+# Format of the output files
+# "xlsx": excel (old behavior), "xlsx-stream": excel written row by row (faster, less memory)
+# "csv": csv files (fastest), "parquet": parquet files (needs the package pyarrow)
+OUTPUT_FORMAT = "xlsx"
+
+# TOKEN LENGTH (TOKEN_LEN) is set in tickets/verifyTokens.py, so that the
+# tokens are made and checked with the same length
+
+# How the tokens are made
+# "random": secure random tokens, which can only be checked with the token file
+# "hmac": the token is derived from the student number and a secret key, so the
+# ticket system can check a token without the token file (see tickets/verifyTokens.py)
+# the secret key is read from the environment variable TICKET_TOKEN_SECRET
+TOKEN_MODE = "random"
 ###########################################
 
 
-def gen_token(student_num: str, e_students: list, e_tokens: list, token_len: int):
+def gen_tokens(n_tokens: int, e_tokens: set, token_len: int):
+    """
+    Helper function that generates n_tokens new tokens at once
+    (same format as secrets.token_urlsafe(token_len))
+
+    It is ensured that the new tokens are unique and not yet present in the
+    existing set of tokens, the new tokens are added to it
     """
-    Helper function that generates a new token for a student, that is identified
-    by their student number
+    tokens = []
+    while len(tokens) < n_tokens:
+        # the random bytes of all missing tokens in one go
+        missing = n_tokens - len(tokens)
+        raw = secrets.token_bytes(missing * token_len)
+        for i in range(0, len(raw), token_len):
+            tk = base64.urlsafe_b64encode(raw[i : i + token_len]).rstrip(b"=").decode("ascii")
+            # if the token already exists then another one is generated in the next round
+            if tk not in e_tokens:
+                e_tokens.add(tk)
+                tokens.append(tk)
+    return tokens
 
-    If the student already has a token then None is returned
 
-    It is ensured that a new token is not yet present in the existing
-    list of tokens!
+def derive_tokens(student_nums, secret: bytes, token_len: int):
     """
-    # check if the student already has a token
-    # if so just return the existing token
-    if student_num in e_students:
-        return None
+    Helper function that derives the tokens of the students (TOKEN_MODE = "hmac")
+    """
+    tokens = [derive_token(s, secret, token_len) for s in student_nums]
+    # two students with the same token are next to impossible for the default length
+    if len(set(tokens)) != len(tokens):
+        raise ValueError("Two students got the same token, please use a larger TOKEN_LEN")
+    return tokens
 
-    # generate a new secure random token
-    tk = secrets.token_urlsafe(token_len)
 
-    # if the token already exists then generate a new one
-    # until a new unique one has been generated
-    while tk in e_tokens:
-        tk = secrets.token_urlsafe(token_len)
+def issue_tokens(store: TokenStore, token_df, config: dict, token_len: int, secret=None):
+    """
+    Helper function that issues tokens to the students in token_df that do
+    not have one in the token store yet, and adds them to the store
+    secret is the secret key of the derived tokens (None = random tokens)
+    Returns the batch number of the new tokens (None if there are no new students)
+    """
+    known = store.known_students(token_df[config["sn_col"]])
+    new_df = token_df[~token_df[config["sn_col"]].astype(str).isin(known)]
+    if new_df.empty:
+        return None
+    if secret is not None:
+        tokens = derive_tokens(new_df[config["sn_col"]], secret, token_len)
+        if store.known_tokens(tokens):
+            raise ValueError("Two students got the same token, please use a larger TOKEN_LEN")
+    else:
+        tokens = gen_tokens(len(new_df), set(), token_len)
+        # replace the tokens that were already issued in an earlier run
+        taken = store.known_tokens(tokens)
+        while taken:
+            fresh = iter(gen_tokens(len(taken), set(tokens) | taken, token_len))
+            tokens = [next(fresh) if tk in taken else tk for tk in tokens]
+            taken = store.known_tokens(tokens)
+    rows = zip(
+        new_df[config["sn_col"]],
+        new_df[config["fname_col"]],
+        new_df[config["lname_col"]],
+        tokens,
+    )
+    return store.add(rows)
 
-    # append the student to existing ones
-    e_students.append(student_num)
 
-    # append the token to the existing ones
-    e_tokens.append(tk)
-    return tk, e_students, e_tokens
+def restore_student_numbers(export_df, token_df, sn_col):
+    """
+    Helper function to give the exported student numbers (saved as text in the
+    token store) the values and type of the student file again, so the token file
+    looks the same as without the token store (e.g. numbers stay numbers)
+    Students that are not in the student file anymore keep the saved text
+    """
+    lookup = dict(zip(token_df[sn_col].astype(str), token_df[sn_col]))
+    student_nums = export_df[sn_col].map(lambda s: lookup.get(s, s))
+    if export_df[sn_col].isin(lookup).all():
+        student_nums = student_nums.astype(token_df[sn_col].dtype)
+    export_df[sn_col] = student_nums
+    return export_df
 
 
-def main(file: str, tk_file: str, config: dict, tk_len: int):
+def main(
+    file: str,
+    tk_file: str,
+    config: dict,
+    tk_len: int,
+    use_cache: bool = USE_CACHE,
+    output_format: str = OUTPUT_FORMAT,
+    token_store: str = TOKEN_STORE,
+    export: str = EXPORT,
+    token_mode: str = TOKEN_MODE,
+):
     """
     The main function of this script
 
     - file: path to the file that holds the student information
     (student first name, last name, student number)
-    - tk_file: path where the output will be saved (must not exist yet!)
+    - tk_file: path where the output will be saved (must not exist yet
+    if no token store is used!)
     - config: configuration that tells how the columns in 'file' are named
-    - tk_len: the length of the tokens in bits
+    - tk_len: the length of the tokens in bytes
+    - use_cache: whether the parsed student file is cached for reruns
+    - output_format: the format of the token file (its file extension is adjusted)
+    - token_store: path of the token store (None = no token store)
+    - export: which tokens of the token store are saved ("new" or "all")
+    - token_mode: how the tokens are made ("random" or "hmac")
     """
     if not os.path.isfile(file):
         print("FATAL ERROR: Could not find the file holding the student info")
         print(f"Provided path is: {file}")
         sys.exit(1)
 
+    if token_mode == "hmac":
+        secret = load_secret()
+    elif token_mode == "random":
+        secret = None
+    else:
+        raise ValueError(f"Unknown token mode: '{token_mode}'")
+
     # stop processing if tk file already exists
     # this is done to not accidentally overwrite
-    if os.path.isfile(tk_file):
+    tk_file = output_path(tk_file, output_format)
+    if token_store is None and os.path.isfile(tk_file):
         print("ERROR: Token file already exists")
         print(f"Provided path is: {tk_file}")
         sys.exit(1)
 
-    token_df = pd.DataFrame(
-        columns=[
-            config["fname_col"],
-            config["lname_col"],
-            config["sn_col"],
-            config["token_col"],
-        ]
-    )
+    student_df = read_roster(file, use_cache)
+
+    # all the students that need a token (every student only once)
+    duplicates = student_df[config["sn_col"]].duplicated()
+    for s in student_df.loc[duplicates, config["sn_col"]].unique():
+        print(f"Skipping duplicate student with number: {s}")
+    token_df = student_df.loc[
+        ~duplicates, [config["fname_col"], config["lname_col"], config["sn_col"]]
+    ].reset_index(drop=True)
 
-    student_df = pd.read_excel(file, header=0)
-
-    # all the students that need a token
-    students = student_df[config["sn_col"]].values
-
-    # lists that will hold already created students and tokens
-    # this is done to prevent duplicates
-    e_students = []
-    e_tokens = []
-
-    # generate a new token for each student
-    for s in students:
-        # duplicate student
-        if s in e_students:
-            print(f"Skipping duplicate student with number: {s}")
-            continue
-        token, e_students, e_tokens = gen_token(s, e_students, e_tokens, tk_len)
-        s_info = student_df[student_df[config["sn_col"]] == s]
-        token_df.loc[-1] = [
-            s_info[config["fname_col"]].values[0],
-            s_info[config["lname_col"]].values[0],
-            s,
-            token,
-        ]
-        token_df.index += 1
-        token_df.sort_index(ascending=True, inplace=True)
+    if token_store is None:
+        # generate a new token for each student
+        if secret is not None:
+            tokens = derive_tokens(token_df[config["sn_col"]], secret, tk_len)
+        else:
+            tokens = gen_tokens(len(token_df), set(), tk_len)
+        token_df[config["token_col"]] = tokens
+    else:
+        # generate a new token for each student that does not have one yet
+        store = TokenStore(token_store)
+        try:
+            batch = issue_tokens(store, token_df, config, tk_len, secret)
+            if batch is None:
+                print("All students already have a token")
+            else:
+                print(f"Issued tokens to new students (batch {batch})")
+            if export == "all":
+                export_df = store.export(config)
+            elif export == "new":
+                if batch is None:
+                    return
+                export_df = store.export(config, batch)
+                stem, ext = os.path.splitext(tk_file)
+                tk_file = f"{stem}_batch{batch}{ext}"
+            else:
+                raise ValueError(f"Unknown export: '{export}'")
+        finally:
+            store.close()
+        token_df = restore_student_numbers(export_df, token_df, config["sn_col"])
 
     # save the new token file
-    token_df.to_excel(tk_file)
+    tk_file = write_table(token_df, tk_file, output_format)
+    print(f"Tokens saved in '{tk_file}'")
 
 
 if __name__ == "__main__":
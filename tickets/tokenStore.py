@@ -0,0 +1,111 @@
+"""
+Helper module for the token store of createTicketTokens.py
+
+The token store is a local SQLite database that keeps every issued token
+together with the student it belongs to. The student number and the token are
+both unique (with an index each), so a rerun with a newer student file only has to
+look up the students in it and issue tokens to the ones that do not have one yet,
+and the check for already existing tokens is a lookup instead of reading all of them
+
+Every run that issues tokens gets a new batch number, so the tokens of one run
+(the new students) or all tokens can be exported at any time
+(it holds the student numbers and tokens, so treat it like the token files!)
+"""
+
+import sqlite3
+import time
+
+import pandas as pd
+
+# the maximum amount of values in one "IN (...)" query (limit of older SQLite versions)
+CHUNK_SIZE = 900
+
+
+class TokenStore:
+    """
+    Class for the token store (SQLite database in the file path)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.con = sqlite3.connect(path)
+        with self.con:
+            self.con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS tokens (
+                    student_number TEXT NOT NULL UNIQUE,
+                    first_name TEXT,
+                    last_name TEXT,
+                    token TEXT NOT NULL UNIQUE,
+                    batch INTEGER NOT NULL,
+                    issued_at TEXT NOT NULL
+                )
+                """
+            )
+
+    def close(self):
+        self.con.close()
+
+    def _lookup(self, column, values):
+        """
+        Helper function to get which of the values are present in the column
+        (uses the unique index of the column)
+        """
+        found = set()
+        values = list(values)
+        for i in range(0, len(values), CHUNK_SIZE):
+            chunk = values[i : i + CHUNK_SIZE]
+            marks = ", ".join("?" * len(chunk))
+            rows = self.con.execute(
+                f"SELECT {column} FROM tokens WHERE {column} IN ({marks})", chunk
+            )
+            found.update(r[0] for r in rows)
+        return found
+
+    def known_students(self, student_numbers):
+        """
+        Helper function to get which of the student numbers already have a token
+        """
+        return self._lookup("student_number", [str(s) for s in student_numbers])
+
+    def known_tokens(self, tokens):
+        """
+        Helper function to get which of the tokens are already issued
+        """
+        return self._lookup("token", tokens)
+
+    def add(self, rows):
+        """
+        Add newly issued tokens, rows are (student number, first name, last name, token)
+        All rows are added in one transaction (or none of them, e.g. if a student
+        number or token is already present)
+        Returns the batch number of the added tokens
+        """
+        issued_at = time.strftime("%Y-%m-%d %H:%M:%S")
+        with self.con:
+            batch = self.con.execute("SELECT COALESCE(MAX(batch), 0) + 1 FROM tokens")
+            batch = batch.fetchone()[0]
+            self.con.executemany(
+                "INSERT INTO tokens VALUES (?, ?, ?, ?, ?, ?)",
+                [(str(s), f, l, tk, batch, issued_at) for s, f, l, tk in rows],
+            )
+        return batch
+
+    def export(self, config, batch=None):
+        """
+        Get the tokens of one batch (None = all tokens) as a dataframe
+        with the columns named as in config
+        """
+        query = "SELECT first_name, last_name, student_number, token FROM tokens"
+        params = ()
+        if batch is not None:
+            query += " WHERE batch = ?"
+            params = (batch,)
+        df = pd.read_sql_query(query + " ORDER BY rowid", self.con, params=params)
+        df.columns = [
+            config["fname_col"],
+            config["lname_col"],
+            config["sn_col"],
+            config["token_col"],
+        ]
+        return df
@@ -0,0 +1,111 @@
+"""
+Tokens that are derived from the student number (TOKEN_MODE = "hmac" in createTicketTokens.py)
+
+Such a token is the HMAC (SHA-256) of the student number with a secret key,
+shortened to TOKEN_LEN bytes (and written like the random tokens).
+So whoever knows the secret key can check a token of a student
+without the token file, and nobody else can create a valid token
+
+The secret key is read from the environment variable TICKET_TOKEN_SECRET
+(never save it in this repository!), e.g. a key can be created with
+'python -c "import secrets; print(secrets.token_urlsafe(32))"'
+
+Usage to check tokens:
+- one token: 'python tickets/verifyTokens.py <student number> <token>'
+- a whole file (xlsx or csv with the columns of createTicketTokens.py):
+  'python tickets/verifyTokens.py --file <token file>'
+"""
+
+import argparse
+import base64
+import hashlib
+import hmac
+import os
+import sys
+
+# name of the environment variable that holds the secret key
+SECRET_ENV = "TICKET_TOKEN_SECRET"
+
+# TOKEN LENGTH (also used by createTicketTokens.py) - only relevant to modify if you
+# know what you are doing, basically the longer this is the longer and more secure
+# the tokens will be. A setting of 16 bytes might not be the most secure, but depending
+# on the context this is sufficient enough will ensuring the token is still not too long
+TOKEN_LEN = 16
+
+
+def load_secret(env: str = SECRET_ENV):
+    """
+    Helper function to get the secret key from the environment variable env
+    """
+    secret = os.environ.get(env)
+    if not secret:
+        print(f"FATAL ERROR: Please set the secret key in the environment variable {env}")
+        sys.exit(1)
+    return secret.encode("utf-8")
+
+
+def derive_token(student_num, secret: bytes, token_len: int = TOKEN_LEN):
+    """
+    Helper function that derives the token of a student from the student number
+    """
+    max_len = hashlib.sha256().digest_size
+    if not 0 < token_len <= max_len:
+        raise ValueError(f"The token length must be between 1 and {max_len}")
+    digest = hmac.new(secret, str(student_num).strip().encode("utf-8"), hashlib.sha256)
+    return base64.urlsafe_b64encode(digest.digest()[:token_len]).rstrip(b"=").decode("ascii")
+
+
+def verify_token(student_num, token: str, secret: bytes, token_len: int = TOKEN_LEN):
+    """
+    Check if token is the token of the student (no token file needed)
+    """
+    # compare in constant time, so the time does not tell how much of a token is right
+    expected = derive_token(student_num, secret, token_len)
+    return hmac.compare_digest(expected, str(token).strip())
+
+
+def verify_tokens(student_nums, tokens, secret: bytes, token_len: int = TOKEN_LEN):
+    """
+    Check many tokens at once
+    Returns a list telling for every (student number, token) pair if the token is valid
+    """
+    return [verify_token(s, tk, secret, token_len) for s, tk in zip(student_nums, tokens)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check ticket tokens (TOKEN_MODE = 'hmac')")
+    parser.add_argument("student_number", nargs="?", help="student number to check")
+    parser.add_argument("token", nargs="?", help="token of the student")
+    parser.add_argument("--file", help="token file (xlsx or csv) to check completely")
+    parser.add_argument("--sn-col", default="Student number", help="student number column")
+    parser.add_argument("--token-col", default="Token", help="token column")
+    parser.add_argument("--token-len", type=int, default=TOKEN_LEN, help="token length")
+    args = parser.parse_args()
+    secret = load_secret()
+
+    if args.file is None:
+        if args.token is None:
+            parser.error("give a student number and a token, or --file")
+        if verify_token(args.student_number, args.token, secret, args.token_len):
+            print("VALID")
+            return 0
+        print("INVALID")
+        return 1
+
+    # (pandas is only needed for the files)
+    import pandas as pd
+
+    if args.file.endswith(".csv"):
+        df = pd.read_csv(args.file, dtype=str)
+    else:
+        df = pd.read_excel(args.file, dtype=str)
+    valid = verify_tokens(df[args.sn_col], df[args.token_col], secret, args.token_len)
+    invalid = df.loc[[not v for v in valid], args.sn_col]
+    print(f"{len(df) - len(invalid)} of {len(df)} tokens are valid")
+    for s in invalid:
+        print(f"Invalid token of student: {s}")
+    return 1 if len(invalid) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())